@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Generates a synthetic results tree and times the scripts on it.
+
+The tree has one directory results_<inst_set>_<config> per configuration, each with
+one subdirectory per class containing the .log (in the format of runlim), .out and .err
+files of every instance, as getFileList and getValuesFromLogAndOutFile expect them.
+
+Every stage runs in a fresh process, which reports its wall time and peak RSS.
+Within a stage, every measured call runs in a forked process, so that its peak RSS is
+its own; the analyses of plotresults.py are forked after loading the data.
+The report is written as JSON.
+"""
+
+import os, sys
+import io
+import json
+import time
+import pickle
+import random
+import shutil
+import resource
+import tempfile
+import subprocess
+import contextlib
+from argparse import ArgumentParser
+
+log_template = """[runlim] version:		1.10
+[runlim] time limit:		%(timeout)d seconds
+[runlim] real time limit:	%(timeout)d seconds
+[runlim] space limit:		8000 MB
+[runlim] argv[0]:		solver
+[runlim] argv[1]:		%(instance)s
+[runlim] start:			Thu Feb  2 10:52:13 2017
+[runlim] main pid:		4242
+%(samples)s[runlim] end:			Thu Feb  2 10:52:14 2017
+[runlim] status:		%(status)s
+[runlim] result:		%(result)d
+[runlim] children:		0
+[runlim] real:			%(time).2f seconds
+[runlim] time:			%(time).2f seconds
+[runlim] space:			%(space).1f MB
+[runlim] samples:		%(n_samples)d
+"""
+
+def writeRun(base, instance, rng, solution, difficulty, timeout, out_lines, err_lines, out_stats, err_stats):
+    t = difficulty * rng.lognormvariate(0, 0.5)
+    space = rng.uniform(5, 2000)
+    if rng.random() < 0.01:
+        status, result, t = "out of memory", 0, min(t, timeout)
+    elif t >= timeout:
+        status, result, t = "out of time", 0, timeout + rng.random()
+    else:
+        status, result = "ok", solution
+    n_samples = min(int(t * 10), 100)
+    samples = "".join("[runlim] sample:		%.2f time, %.2f real, %.0f MB, 99.9%% CPU\n" % (k / 10, k / 10, space) for k in range(n_samples))
+
+    with open(base + ".log", "w") as f:
+        f.write(log_template % {"timeout": timeout, "instance": instance, "samples": samples, "status": status,
+                                "result": result, "time": t, "space": space, "n_samples": n_samples})
+    with open(base + ".out", "w") as f:
+        f.write("c solving %s\n" % instance * out_lines)
+        for identifier in out_stats:
+            f.write("%s %d\n" % (identifier, rng.randrange(100000)))
+    with open(base + ".err", "w") as f:
+        f.write("c warning\n" * err_lines)
+        for identifier in err_stats:
+            f.write("%s %d\n" % (identifier, rng.randrange(100000)))
+
+def generateTree(root, n_classes, n_instances, n_configs, out_lines=200, err_lines=10, timeout=900, seed=0, inst_set="synth"):
+    """
+    Writes 'n_configs' results directories into 'root', each with 'n_classes'
+    classes of 'n_instances' instances. Returns the list of results directories.
+    """
+    from parseresults import fields
+
+    out_stats = [identifier for column, source, identifier, pattern in fields if source == "out"]
+    err_stats = [identifier for column, source, identifier, pattern in fields if source == "err"]
+
+    rng = random.Random(seed)
+    # every instance has a fixed answer and difficulty, every config a speed
+    instances = [("class%03d" % c, "inst%06d" % i, rng.choice((10, 20)), rng.lognormvariate(2, 2.5))
+                 for c in range(n_classes) for i in range(n_instances)]
+    speeds = [rng.lognormvariate(0, 0.5) for j in range(n_configs)]
+
+    results_dirs = []
+    for j, speed in enumerate(speeds):
+        results_dir = os.path.join(root, "results_%s_c%02d" % (inst_set, j))
+        results_dirs.append(results_dir)
+        for c in range(n_classes):
+            os.makedirs(os.path.join(results_dir, "class%03d" % c), exist_ok=True)
+        for classname, instance, solution, difficulty in instances:
+            writeRun(os.path.join(results_dir, classname, instance), instance, rng, solution, difficulty * speed,
+                     timeout, out_lines, err_lines, out_stats, err_stats)
+    return results_dirs
+
+def peakRSS():
+    """
+    Peak resident set size in KiB of this process and its finished children.
+    """
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+def timed(results, stage, runs, function, *args):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        value = function(*args)
+    wall = time.perf_counter() - start
+    results.append({"stage": stage, "wall": wall, "runs": runs, "throughput": runs / wall if wall > 0 else None, "peak_rss_kb": peakRSS()})
+    return value
+
+def forked(function, *args):
+    """
+    Calls function(*args) in a forked process and returns its (picklable) return value.
+    The peak RSS measured in that process is that of this call only, on top of what this
+    process held when forking, and not the highest of all calls so far.
+    """
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        status = 1
+        try:
+            value = function(*args)
+            with os.fdopen(write_end, "wb") as f:
+                pickle.dump(value, f)
+            status = 0
+        finally:
+            os._exit(status)
+    os.close(write_end)
+    with os.fdopen(read_end, "rb") as f:
+        output = f.read()
+    _, status = os.waitpid(pid, 0)
+    if status != 0:
+        raise RuntimeError("the forked process running %s failed" % getattr(function, "__name__", function))
+    return pickle.loads(output)
+
+def timedForked(results, stage, runs, function, *args):
+    """
+    Like timed, but calls 'function' in a forked process (see forked).
+    """
+    def measure():
+        child_results = []
+        value = timed(child_results, stage, runs, function, *args)
+        return child_results, value
+
+    child_results, value = forked(measure)
+    results += child_results
+    return value
+
+def stageFileList(results, results_dirs, csv_files, jobs):
+    from parseresults import getFileList
+
+    for results_dir in results_dirs:
+        runs = timedForked(results, "getFileList", 0, lambda results_dir: len(getFileList(results_dir)), results_dir)
+        results[-1]["runs"] = runs
+        results[-1]["throughput"] = runs / results[-1]["wall"]
+
+def stageParse(results, results_dirs, csv_files, jobs):
+    from parseresults import getFileList, getResultsFromFileList, sortRows, writeCSV, merge_key
+
+    def parse(results_dir, out_file):
+        writeCSV(out_file, sortRows(getResultsFromFileList(getFileList(results_dir), results_dir, jobs), key=merge_key))
+
+    for results_dir, out_file in zip(results_dirs, csv_files):
+        runs = sum(f.endswith(".log") for _, _, files in os.walk(results_dir) for f in files)
+        timedForked(results, "parseresults", runs, parse, results_dir, out_file)
+
+def stageFilter(results, results_dirs, csv_files, jobs):
+    import filter
+
+    def easySet():
+        import plotresults
+
+        classes, configurations, instances, rundata, timeout = plotresults.init(csv_files, False)
+        return filter.read_easy(plotresults.getEasy(classes, configurations, instances, rundata, threshold=timeout // 10))
+
+    # the data is loaded in another process, so that it does not count towards the filter
+    easy = forked(easySet)
+    copies = [csv_file + ".filtered" for csv_file in csv_files]
+    for csv_file, copy in zip(csv_files, copies):
+        shutil.copyfile(csv_file, copy)
+    for copy in copies:
+        with open(copy) as f:
+            runs = sum(1 for line in f) - 1
+        timedForked(results, "filter", runs, filter.filter_file, copy, easy)
+        os.remove(copy)
+
+def stagePlot(results, results_dirs, csv_files, jobs):
+    import plotresults as p
+
+    def load(*args):
+        p.init(*args)
+
+    for csv_file in csv_files:
+        if os.path.exists(p.binaryName(csv_file)):
+            os.remove(p.binaryName(csv_file))
+    # the first init parses the CSV files and writes their binary companions, the second loads those
+    timedForked(results, "init (csv)", 0, load, csv_files, False, jobs)
+    timedForked(results, "init (binary)", 0, load, csv_files, False, jobs)
+    # the data the analyses run on, which every analysis process starts with
+    classes, configurations, instances, rundata, timeout = p.init(csv_files, False, jobs)
+    runs = len(rundata)
+    for entry in results:
+        entry["runs"] = runs
+        entry["throughput"] = runs / entry["wall"]
+
+    analyses = [("verify", p.verify, ()),
+                ("printStats", p.printStats, (timeout,)),
+                ("getEasy", p.getEasy, ()),
+                ("solvedMatrix", p.solvedMatrix, ()),
+                ("timeMatrix", p.timeMatrix, ()),
+                ("analyzeFamilies", p.analyzeFamilies, ()),
+                ("findOutliers", p.findOutliers, ()),
+                ("venn", p.venn, ()),
+                ("printUnique", p.printUnique, ()),
+                ("printUnsolved", p.printUnsolved, ()),
+                ("bestTimeout", lambda *args: p.bestTimeout(*args, text=True), (timeout,)),
+                ("bootstrap", lambda *args: p.bootstrap(*args, resamples=1000, seed=0), (timeout,)),
+                ("portfolio", p.portfolio, (timeout,))]
+    for name, analysis, extra in analyses:
+        timedForked(results, name, runs, analysis, classes, configurations, instances, rundata, *extra)
+
+stages = {"getFileList": stageFileList,
+          "parseresults": stageParse,
+          "plotresults": stagePlot,
+          "filter": stageFilter}
+
+def runStage(stage, results_dirs, csv_files, jobs):
+    """
+    Runs the stage in a fresh process and returns its measurements.
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--stage", stage, "--jobs", str(jobs),
+               "--results-dirs", *results_dirs, "--csv-files", *csv_files]
+    output = subprocess.run(command, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return json.loads(output)
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("-c", "--classes", type=int, default=10, help="Number of classes. The default is 10.")
+    parser.add_argument("-i", "--instances", type=int, default=100, help="Number of instances per class. The default is 100.")
+    parser.add_argument("-k", "--configs", type=int, default=3, help="Number of configurations. The default is 3.")
+    parser.add_argument("--out-lines", type=int, default=200, help="Number of lines of solver output in every .out file before the statistics. The default is 200.")
+    parser.add_argument("--err-lines", type=int, default=10, help="Number of lines in every .err file before the statistics. The default is 10.")
+    parser.add_argument("--timeout", type=int, default=900, help="Time limit of the synthetic runs. The default is 900.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generator. The default is 0.")
+    parser.add_argument("-d", "--dir", type=str, default=None, help="Generate the tree into this directory and keep it. By default a temporary directory is used and removed afterwards.")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of processes used by the scripts where they support it. The default is 1.")
+    parser.add_argument("-s", "--stages", nargs="+", choices=list(stages), default=list(stages), help="Stages to run. The default is all of them.")
+    parser.add_argument("-o", "--outfile", type=str, default=None, help="Write the JSON report to this file instead of stdout.")
+    # internal: run one stage in this process
+    parser.add_argument("--stage", choices=list(stages), default=None, help="(internal) Run a single stage and print its measurements.")
+    parser.add_argument("--results-dirs", nargs="*", default=[], help="(internal) The results directories of the tree.")
+    parser.add_argument("--csv-files", nargs="*", default=[], help="(internal) The CSV files written by the parseresults stage.")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    if args.stage is not None:
+        results = []
+        stages[args.stage](results, args.results_dirs, args.csv_files, args.jobs)
+        print(json.dumps(results))
+        sys.exit(0)
+
+    root = args.dir if args.dir is not None else tempfile.mkdtemp(prefix="benchmark_")
+    try:
+        start = time.perf_counter()
+        results_dirs = generateTree(root, args.classes, args.instances, args.configs, args.out_lines, args.err_lines, args.timeout, args.seed)
+        generation_time = time.perf_counter() - start
+        csv_files = [os.path.join(root, os.path.basename(results_dir) + ".csv") for results_dir in results_dirs]
+
+        # the other stages need the CSV files
+        selected = [stage for stage in stages if stage in args.stages or stage == "parseresults"]
+        report = {"parameters": {"classes": args.classes, "instances": args.instances, "configs": args.configs,
+                                 "runs": args.classes * args.instances * args.configs, "out_lines": args.out_lines,
+                                 "err_lines": args.err_lines, "jobs": args.jobs, "seed": args.seed,
+                                 "python": sys.version.split()[0], "generation_time": generation_time},
+                  "stages": []}
+        for stage in selected:
+            report["stages"] += runStage(stage, results_dirs, csv_files, args.jobs)
+    finally:
+        if args.dir is None:
+            shutil.rmtree(root)
+
+    if args.outfile is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.outfile, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compact binary companion format for the results CSVs.
+
+The file stores the columns of a results CSV that plotresults.py needs as typed
+arrays, with the strings (names, classes, configurations and statuses) replaced
+by ids into string dictionaries:
+
+    magic          b"RESBIN1\\n"
+    header length  uint64, little endian
+    header         JSON: number of rows, size of the source CSV, the dictionaries,
+                   and for every column its dtype and offset in the file
+    columns        raw little-endian arrays, each aligned to 8 bytes
+
+Writing only needs the standard library, reading needs numpy and maps the file into memory.
+"""
+
+import os, sys
+import json
+import math
+import mmap
+import struct
+from array import array
+
+magic = b"RESBIN1\n"
+
+# column: (array typecode, numpy dtype)
+column_types = {"name": ("i", "<i4"),
+                "class": ("i", "<i4"),
+                "config": ("i", "<i4"),
+                "status": ("i", "<i4"),
+                "time": ("d", "<f8"),
+                "result": ("b", "|i1")}
+
+dictionary_columns = ["name", "class", "config", "status"]
+
+ans_dict = {"10" : 1, "20" : 0}
+
+class ColumnBuilder:
+    """
+    Collects rows into typed columns, interning the string columns.
+    """
+
+    def __init__(self):
+        self.ids = {column : {} for column in dictionary_columns}
+        self.columns = {column : array(typecode) for column, (typecode, _) in column_types.items()}
+
+    def add(self, name, time, result, status, classname, config):
+        columns, ids = self.columns, self.ids
+        columns["name"].append(ids["name"].setdefault(name, len(ids["name"])))
+        columns["class"].append(ids["class"].setdefault(classname, len(ids["class"])))
+        columns["config"].append(ids["config"].setdefault(config, len(ids["config"])))
+        columns["status"].append(ids["status"].setdefault(status, len(ids["status"])))
+        try:
+            columns["time"].append(float(time))
+        except ValueError:
+            columns["time"].append(math.nan)
+        columns["result"].append(ans_dict.get(result, -1))
+
+    def addRows(self, rows, header):
+        """
+        Adds the rows (lists of strings in the order of 'header') and yields them again,
+        so that the builder can be put in front of another consumer of the rows.
+        """
+        indices = [header.index(column) for column in ("Name", "Time", "Result", "Status", "Class", "Configuration")]
+        for row in rows:
+            self.add(*(row[i] for i in indices))
+            yield row
+
+    def dictionaries(self):
+        return {column : list(self.ids[column]) for column in dictionary_columns}
+
+def writeBinary(filename, columns, dictionaries, source_size=None):
+    """
+    Writes the columns (arrays from the array module or numpy arrays) and dictionaries in the binary format.
+    'source_size' is the size of the CSV the data comes from, which readBinary can check.
+    """
+    data = {}
+    for column, (typecode, dtype) in column_types.items():
+        values = columns[column]
+        if not isinstance(values, array):
+            # a numpy array
+            data[column] = values.astype(dtype).tobytes()
+            continue
+        if sys.byteorder == "big":
+            values = array(typecode, values)
+            values.byteswap()
+        data[column] = values.tobytes()
+
+    rows = len(columns["time"])
+    layout = {}
+    offset = 0
+    for column, raw in data.items():
+        layout[column] = [column_types[column][1], offset]
+        offset += (len(raw) + 7) // 8 * 8
+    header = json.dumps({"rows": rows, "source_size": source_size, "dictionaries": dictionaries, "columns": layout}).encode()
+    start = (len(magic) + 8 + len(header) + 7) // 8 * 8
+
+    with open(filename + ".tmp", "wb") as f:
+        f.write(magic)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for column, raw in data.items():
+            f.seek(start + layout[column][1])
+            f.write(raw)
+        f.truncate(start + offset)
+    os.replace(filename + ".tmp", filename)
+
+def readBinary(filename, source_size=None):
+    """
+    Maps a file written by writeBinary into memory and returns (columns, dictionaries),
+    where the columns are read-only numpy arrays backed by the mapping.
+    Returns None if the file is not in the binary format, or if 'source_size' is given
+    and differs from the size of the CSV the file was written for.
+    """
+    import numpy as np
+
+    with open(filename, "rb") as f:
+        if f.read(len(magic)) != magic:
+            return None
+        header_length, = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_length))
+        if source_size is not None and header["source_size"] != source_size:
+            return None
+        start = (len(magic) + 8 + header_length + 7) // 8 * 8
+        rows = header["rows"]
+        if rows == 0:
+            buffer = b""
+        else:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    columns = {}
+    for column, (dtype, offset) in header["columns"].items():
+        columns[column] = np.frombuffer(buffer, dtype=dtype, count=rows, offset=start + offset if rows else 0)
+    return columns, header["dictionaries"]
+
+def binaryName(csv_filename):
+    return csv_filename + ".bin"
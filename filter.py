@@ -1,34 +1,85 @@
 #!/usr/bin/env python3
 
-import sys
+import os, sys
+import shutil
+import tempfile
+import multiprocessing
+from argparse import ArgumentParser
 
-def read_easy(filename):
+def read_easy(f):
+    """
+    Reads the easy instances as printed by 'plotresults.py --easy', one class/instance per line.
+    Other lines that plotresults.py prints along with them are skipped.
+    """
     easy_instances = set()
-    with open(filename) as f:
-        for line in f:
-            classname, instance = line.strip().split("/")
-            easy_instances.add((classname, instance))
+    for line in f:
+        line = line.strip()
+        if "/" not in line or any(c.isspace() for c in line):
+            continue
+        classname, instance = line.split("/", 1)
+        if classname == "_ALL_" and "/" in instance:
+            # printed with --aggregate, the instance name includes the real class
+            classname, instance = instance.split("/", 1)
+        easy_instances.add((classname, instance))
     return easy_instances
 
-def read_and_filter(filename, easy_set):
-    filtered_results = []
-    with open(filename) as f:
-        header = next(f)
-        filtered_results.append(header)
-        for line in f:
-            cells = line.strip().split(",")
-            classname = cells[-2]
-            instance = cells[0]
-            if (classname, instance) not in easy_set:
-                filtered_results.append(line)
-    return filtered_results
-                
+def filter_file(filename, easy_set):
+    """
+    Removes the rows of the easy instances from the results CSV 'filename'.
+    The rows are streamed into a temporary file next to it, which then replaces
+    the original, so the original is left intact if anything goes wrong.
+    Returns the number of removed rows.
+    """
+    directory, basename = os.path.split(os.path.abspath(filename))
+    fd, tmp_filename = tempfile.mkstemp(dir=directory, prefix="." + basename + ".", suffix=".tmp")
+    removed = 0
+    try:
+        with os.fdopen(fd, "w") as out, open(filename) as f:
+            header = next(f)
+            columns = header.rstrip("\n").split(",")
+            class_idx = columns.index("Class")
+            name_idx = columns.index("Name")
+            out.write(header)
+            for line in f:
+                cells = line.rstrip("\n").split(",")
+                if (cells[class_idx], cells[name_idx]) in easy_set:
+                    removed += 1
+                else:
+                    out.write(line)
+        shutil.copymode(filename, tmp_filename)
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        os.unlink(tmp_filename)
+        raise
+    return removed
+
+easy_instances = None
+
+def init_worker(easy_set):
+    global easy_instances
+    easy_instances = easy_set
+
+def filter_worker(filename):
+    return filter_file(filename, easy_instances)
+
 if __name__ == "__main__":
-    easy_file = sys.argv[1]
-    easy_instances = read_easy(easy_file)
+    parser = ArgumentParser()
+    parser.add_argument("easy_file", help="File with the easy instances as printed by 'plotresults.py --easy', or - to read them from stdin.")
+    parser.add_argument("results", nargs="*", help="The csv files from which the easy instances are removed.")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of files filtered concurrently. 0 means one per CPU. The default is 1.")
+    args = parser.parse_args()
+
+    if args.easy_file == "-":
+        easy_instances = read_easy(sys.stdin)
+    else:
+        with open(args.easy_file) as f:
+            easy_instances = read_easy(f)
     print(len(easy_instances))
 
-    for i in range(2, len(sys.argv)):
-        filtered_results = read_and_filter(sys.argv[i], easy_instances)
-        with open(sys.argv[i], "w") as f:
-            print("".join(filtered_results), file=f, end="")
+    jobs = args.jobs if args.jobs > 0 else multiprocessing.cpu_count()
+    if jobs > 1 and len(args.results) > 1:
+        with multiprocessing.Pool(min(jobs, len(args.results)), init_worker, (easy_instances,)) as p:
+            p.map(filter_worker, args.results, 1)
+    else:
+        for filename in args.results:
+            filter_file(filename, easy_instances)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Minimal binding of Linux inotify with ctypes, for the --watch mode of parseresults.py.
+"""
+
+import os
+import ctypes
+import ctypes.util
+import select
+import struct
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+# struct inotify_event without the name that follows it
+event_header = struct.Struct("iIII")
+
+class Inotify:
+    """
+    Watches directories for files that are closed after writing or moved into them,
+    and for new subdirectories. Raises OSError if inotify is not available.
+    """
+
+    def __init__(self):
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            self.libc.inotify_init1
+        except (OSError, AttributeError):
+            raise OSError("inotify is not available")
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            self.raiseError()
+        self.paths = {}
+
+    def raiseError(self):
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+    def add(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+        if wd < 0:
+            self.raiseError()
+        self.paths[wd] = path
+
+    def read(self, timeout=None):
+        """
+        Waits up to 'timeout' seconds for events and returns them as a list of (path, is_dir)
+        of the files written or moved in and the new directories, or None if events were lost
+        because the queue of the kernel overflowed.
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        events = []
+        overflow = False
+        while True:
+            try:
+                data = os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = event_header.unpack_from(data, offset)
+                name = data[offset + event_header.size:offset + event_header.size + length].rstrip(b"\0")
+                offset += event_header.size + length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                elif mask & IN_IGNORED:
+                    # the directory was removed
+                    self.paths.pop(wd, None)
+                elif wd in self.paths and name and (mask & (IN_ISDIR | IN_CLOSE_WRITE | IN_MOVED_TO)):
+                    events.append((os.path.join(self.paths[wd], os.fsdecode(name)), bool(mask & IN_ISDIR)))
+        return None if overflow else events
+
+    def close(self):
+        os.close(self.fd)
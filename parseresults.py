@@ -2,90 +2,304 @@
 # -*- coding: utf-8 -*-
 
 import re, os, sys
+import io
+import math
+import zlib
+import socket
+import bz2
+import codecs
+import gzip
+import lzma
+import tarfile
+import json
+import heapq
+import pickle
+import sqlite3
+import tempfile
+import time
 import multiprocessing
-from argparse import ArgumentParser
+from argparse import ArgumentParser, ArgumentTypeError
 from operator import itemgetter
+from functools import partial
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 
-patterns = [r"[^\s/]*$", r"([^\s]*) [^\s]*$", r"([^\s]*) [^\s]*$", r"[^\s]*$", r"[^\s]*$"]
-regex = [re.compile(pattern) for pattern in patterns]
-group = [0, 1, 1, 0, 0]
-header = ["Name", "Time", "Space", "Result", "Status", "LC", "LT", "FDA", "BT", "BTDL", "TD", "LD", "FLD", "DCR", "PI", "LR", "TRD", "TRR", "DEPQBFFDA", "DEPQBFBT", "Class", "Configuration"]
-log_identifiers = [None, "time:", "space:", "result:", "status:"]
-out_identifiers = ["Number of learned clauses:",
-                   "Number of learned terms:",
-                   "Fraction of decisions among assignments:",
-                   "Number of backtracks:",
-                   "Number of backtracks caused by dependency learning:",
-                   "Number of trivial dependencies:",
-                   "Number of learned dependencies:", 
-                   "Learned dependencies as a fraction of trivial:",
-                   "Number of dependency conflicts resolved by RRS:",
-                   "Number of proven independencies:",
-                   "Number of literals reduced thanks to RRS:",
-                   "Amount of time spent computing RRS deps (s):",
-                   "Amount of time spent on generalized forall reduction (s):"]
-                   
-
-err_identifiers = ["dec. per assignm.:",
-                   "backtracks:"]                
-
-
-def getValuesFromLogAndOutFile(filename, general=False):
+from binresults import ColumnBuilder, writeBinary, binaryName
+from profiling import Profile
+from inotify import Inotify
+
+# The values parsed for every run, in the order of their columns in the CSV.
+# Every field is (column, source, identifier, pattern): the value is taken from
+# the first line of the file with extension 'source' that contains 'identifier'.
+# In .log files the identifier may appear anywhere in the line and 'pattern'
+# extracts the value from the line (group 1 if the pattern has a group).
+# In .out and .err files the identifier has to start the line, and the value
+# is the rest of the line.
+fields = [("Time", "log", "time:", r"([^\s]*) [^\s]*$"),
+          ("Space", "log", "space:", r"([^\s]*) [^\s]*$"),
+          ("Result", "log", "result:", r"[^\s]*$"),
+          ("Status", "log", "status:", r"[^\s]*$"),
+          ("LC", "out", "Number of learned clauses:", None),
+          ("LT", "out", "Number of learned terms:", None),
+          ("FDA", "out", "Fraction of decisions among assignments:", None),
+          ("BT", "out", "Number of backtracks:", None),
+          ("BTDL", "out", "Number of backtracks caused by dependency learning:", None),
+          ("TD", "out", "Number of trivial dependencies:", None),
+          ("LD", "out", "Number of learned dependencies:", None),
+          ("FLD", "out", "Learned dependencies as a fraction of trivial:", None),
+          ("DCR", "out", "Number of dependency conflicts resolved by RRS:", None),
+          ("PI", "out", "Number of proven independencies:", None),
+          ("LR", "out", "Number of literals reduced thanks to RRS:", None),
+          ("TRD", "out", "Amount of time spent computing RRS deps (s):", None),
+          ("TRR", "out", "Amount of time spent on generalized forall reduction (s):", None),
+          ("DEPQBFFDA", "err", "dec. per assignm.:", None),
+          ("DEPQBFBT", "err", "backtracks:", None)]
+
+sources = ["log", "out", "err"]
+# lines of a source containing this string are ignored
+skip_lines = {"log": "sample:"}
+
+header = ["Name"] + [field[0] for field in fields] + ["Class", "Configuration"]
+
+def compileExtractor(source):
+    """
+    Compiles the identifiers of all fields of 'source' into a single regex,
+    in which the identifier of the k-th field is the k-th group.
+    Returns (finder, value_regex, skip), where finder is the search or match
+    method of the regex, and value_regex[k] is the compiled pattern of the k-th field.
+    """
+    source_fields = [field for field in fields if field[1] == source]
+    identifier_regex = re.compile("|".join("(%s)" % re.escape(identifier) for column, _, identifier, pattern in source_fields))
+    finder = identifier_regex.search if source == "log" else identifier_regex.match
+    value_regex = [None if pattern is None else re.compile(pattern) for column, _, identifier, pattern in source_fields]
+    return finder, value_regex, skip_lines.get(source)
+
+extractors = {source: compileExtractor(source) for source in sources}
+
+def extractValues(lines, source):
+    """
+    Scans 'lines' once and returns the values of all fields of 'source' ("NA" if absent).
+    Stops reading as soon as all fields have been found.
+    """
+    finder, value_regex, skip = extractors[source]
+    values = [None] * len(value_regex)
+    remaining = len(values)
+    for s in lines:
+        if skip is not None and skip in s:
+            continue
+        match = finder(s)
+        if match is None:
+            continue
+        k = match.lastindex - 1
+        if values[k] is not None:
+            continue
+        if value_regex[k] is None:
+            values[k] = s[match.end():].strip()
+        else:
+            value_match = value_regex[k].search(s)
+            if not value_match:
+                continue
+            values[k] = value_match.group(value_match.lastindex or 0)
+        remaining -= 1
+        if remaining == 0:
+            break
+    return ["NA" if value is None else value for value in values]
+
+status_idx = header.index("Status")
+result_idx = header.index("Result")
+time_idx = header.index("Time")
+
+def openZstd(file, mode="rb"):
+    """
+    Opens the zstd compressed 'file' (a path or a binary file object) for reading in 'mode'
+    ("rb" or "rt"), with compression.zstd (Python >= 3.14) or the zstandard package.
+    """
+    try:
+        from compression import zstd
+        return zstd.open(file, mode)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("Reading .zst files needs Python 3.14 or the zstandard package.")
+    if isinstance(file, str):
+        file = open(file, "rb")
+    reader = zstandard.ZstdDecompressor().stream_reader(file, closefd=True)
+    return io.TextIOWrapper(reader) if "t" in mode else reader
+
+# .log, .out and .err files with one of these extensions are decompressed while reading
+compressions = {".gz": gzip.open, ".xz": lzma.open, ".bz2": bz2.open, ".zst": openZstd}
+archive_suffixes = [".tar", ".tar.gz", ".tgz", ".tar.xz", ".txz", ".tar.bz2", ".tbz2", ".tar.zst", ".tzst"]
+
+# <instance>.<source>[.<compression>]
+run_file_regex = re.compile(r"(.*)\.(%s)(%s)?$" % ("|".join(sources), "|".join(re.escape(c) for c in compressions)))
+
+def openRunFile(file, compression=None):
+    """
+    Opens a .log, .out or .err file (a path or a binary file object) for reading text,
+    decompressing it according to 'compression' (e.g. ".gz").
+    """
+    if isinstance(file, str):
+        return compressions[compression](file, "rt") if compression else open(file)
+    if compression:
+        file = compressions[compression](file)
+    # members of a tar archive read as a stream are not seekable, which io.TextIOWrapper needs
+    return codecs.getreader("utf-8")(file)
+
+def getArchiveSuffix(path):
+    return next((suffix for suffix in archive_suffixes if path.endswith(suffix)), None)
+
+def stripArchiveSuffix(path):
+    suffix = getArchiveSuffix(path)
+    return path[:-len(suffix)] if suffix else path
+
+def combineValues(name, source_values, general=False):
+    """
+    Puts together the row of a run from the values parsed from its files,
+    given as source_values[source]. Missing files give "NA" values.
+    """
+    values = [name]
+    for source in sources:
+        if general and source != "log":
+            break
+        values += source_values.get(source) or ["NA"] * len(extractors[source][1])
+
+    if values[status_idx] == "ok" and values[result_idx] not in ["10","20"]:
+        values[status_idx] = "time"
+
+    return values
+
+def getValuesFromLogAndOutFile(filename, general=False, timings=None, present=None):
     """
     Parses the Instance name, Running time, Space and Result
     from a log file.
     
     Additionally also parses other stats from the corresponding .out and .err files.
     This can be used to collect values output by --print-stats.
+
+    Any of the files can be compressed (e.g. inst.log.gz, inst.out.xz).
+
+    If 'timings' is a dict, the time spent on every file and its size are stored
+    in it as timings[extension] = (seconds, bytes).
+
+    If the files that exist for this run are known (see getFileList), their extensions
+    can be passed as 'present' (e.g. ("log", "out.gz")) to save looking for them.
     """
-    
-    global regex, group, log_identifiers
-    log_values = ["Name", "Time", "Space", "Result", "Status"]
-    log_values[0] = filename[filename.rfind("/")+1:-4]
-    
-    with open(filename) as f:
-        for s in f:
-            if "sample:" in s:
-                continue
-            for i in range(1, len(log_identifiers)):
-                if log_identifiers[i] in s:
-                    match = regex[i].search(s)
-                    if match:
-                        log_values[i] = match.group(group[i])
+
+    directory, logfile = os.path.split(filename)
+    stem, _, log_compression = run_file_regex.match(logfile).groups()
+    if present is None:
+        present = ["log" + (log_compression or "")]
+        for source in sources[1:]:
+            for suffix in [source] + [source + compression for compression in compressions]:
+                if os.path.isfile(os.path.join(directory, stem + "." + suffix)):
+                    present.append(suffix)
                     break
-    
-    if log_values[4] == "ok" and log_values[3] not in ["10","20"]:
-        log_values[4] = "time"
-
-    if general:
-        return log_values
-
-    out_values = ["NA"] * len(out_identifiers)
-    filename = filename[:-3] + "out"
-    if os.path.isfile(filename):
-        with open(filename) as f:
-            for s in f:
-                for i,v in enumerate(out_identifiers):
-                    if s.startswith(v):
-                        out_values[i] = s[len(v):].strip()
-                        break
-    
-    err_values = ["NA"] * len(err_identifiers)
-    filename = filename[:-3] + "err"
-    if os.path.isfile(filename):
-        with open(filename) as f:
-            for s in f:
-                for i,v in enumerate(err_identifiers):
-                    if s.startswith(v):
-                        err_values[i] = s[len(v):].strip()
-                        break
-
-    return log_values + out_values + err_values
+
+    source_values = {}
+    for suffix in present:
+        source, _, compression = suffix.partition(".")
+        if general and source != "log":
+            continue
+        source_file = os.path.join(directory, stem + "." + suffix)
+        start = time.perf_counter()
+        with openRunFile(source_file, compression and "." + compression) as f:
+            source_values[source] = extractValues(f, source)
+        if timings is not None:
+            timings[source] = (time.perf_counter() - start, os.path.getsize(source_file))
+
+    return combineValues(stem, source_values, general)
+
+def parseArchive(filename, strip=None, general=False, timings=None):
+    """
+    Parses all runs whose .log, .out and .err files are stored in the tar archive 'filename'
+    (possibly compressed), reading the archive once as a stream.
+    Returns a list of (directory inside the archive, values) in the order of the
+    .log files in the archive. A leading directory named 'strip' is removed from the paths,
+    and like in getFileList, files in hidden directories are skipped.
+    """
+    start = time.perf_counter()
+    runs = {}
+    logs = []
+    stream = openZstd(filename) if filename.endswith((".zst", ".tzst")) else None
+    try:
+        with tarfile.open(filename, "r|*", fileobj=stream) if stream is None else tarfile.open(fileobj=stream, mode="r|") as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                parts = [part for part in member.name.split("/") if part not in ("", ".")]
+                if strip is not None and len(parts) > 1 and parts[0] == strip:
+                    parts = parts[1:]
+                if any(part[0] == "." for part in parts[:-1]):
+                    continue
+                match = run_file_regex.match(parts[-1])
+                if not match:
+                    continue
+                stem, source, compression = match.groups()
+                key = ("/".join(parts[:-1]), stem)
+                run = runs.setdefault(key, {})
+                if source in run or (general and source != "log"):
+                    continue
+                with openRunFile(tar.extractfile(member), compression) as f:
+                    run[source] = extractValues(f, source)
+                if source == "log":
+                    logs.append(key)
+    finally:
+        if stream is not None:
+            stream.close()
+
+    if timings is not None:
+        timings["tar"] = (time.perf_counter() - start, os.path.getsize(filename))
+    return [(directory, combineValues(stem, runs[(directory, stem)], general)) for directory, stem in logs]
 
 root_filter_pattern = r"[^/]*$"
 root_filter_regex = re.compile(root_filter_pattern)
 
-def getFileList(in_dir="results"):
+def listDirectory(path):
+    """
+    Lists the directory 'path' once. Returns its subdirectories that are not hidden,
+    and the runs in it in the order of their .log files. Every run is given as
+    its .log file together with the extensions of all files of the run that exist,
+    e.g. ("inst.log", ("log", "out.gz")). Tar archives are given as (archive, ("tar", None)).
+    Like os.walk, does not descend into symbolic links to directories,
+    and treats unreadable directories as empty.
+    """
+    subdirs = []
+    files = {}
+    items = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir():
+                    if entry.name[0] != "." and not entry.is_symlink():
+                        subdirs.append(entry.name)
+                elif getArchiveSuffix(entry.name):
+                    items.append((entry.name, ("tar", None)))
+                else:
+                    match = run_file_regex.match(entry.name)
+                    if match:
+                        stem, source, compression = match.groups()
+                        run = files.setdefault(stem, {})
+                        if source not in run:
+                            run[source] = source + (compression or "")
+                            if source == "log":
+                                items.append((entry.name, stem))
+    except OSError:
+        return [], []
+    runs = [(f, stem) if isinstance(stem, tuple) else (f, tuple(files[stem][source] for source in sources if source in files[stem]))
+            for f, stem in items]
+    return subdirs, runs
+
+def getClassName(root, in_dir):
+    classname = root_filter_regex.search(root).group(0)
+    if classname == in_dir:
+        # This means that instances are not further distributed into classes.
+        # Because of that, let all instancess have the same class '_ALL_'.
+        classname = "_ALL_"
+    return classname
+
+def getFileList(in_dir="results", threads=8):
     """
     The experiment setup assumes we will run different configurations (solvers)
     on benchmark sets divided into classes.
@@ -99,29 +313,245 @@ def getFileList(in_dir="results"):
     of a given instances is the name of its immediate containing directory. In case the
     benchmark set does not have classes, simply put all instances directly to 'in_dir'
     and the classname '_ALL_' will be assigned to all instances.
+
+    The files may be compressed, and parts of the tree may be packed into tar archives,
+    whose contents count as if they were unpacked next to the archive. 'in_dir' itself
+    can also be a tar archive of the results directory.
+
+    Returns a list of (directory, class, .log file, extensions of the files of the run),
+    in the order of os.walk, with an entry (directory, class, archive, ("tar", ...)) for
+    every archive. Every directory is listed only once, and the directories
+    of each level of the tree are listed concurrently by 'threads' threads.
     """
 
+    if os.path.isfile(in_dir) and getArchiveSuffix(in_dir):
+        # strip the results directory if the archive contains it
+        top = os.path.basename(stripArchiveSuffix(in_dir))
+        return [(os.path.dirname(in_dir), "_ALL_", os.path.basename(in_dir), ("tar", top))]
+
+    listings = {}
+    level = [in_dir]
+    with ThreadPoolExecutor(max(1, threads)) as pool:
+        while level:
+            next_level = []
+            for root, (subdirs, runs) in zip(level, pool.map(listDirectory, level)):
+                listings[root] = (subdirs, runs)
+                next_level += [os.path.join(root, d) for d in subdirs]
+            level = next_level
+
     file_list = []
-    for root, dirs, files in os.walk(in_dir):
-        dirs[:] = [d for d in dirs if d[0] != "."]
-        classname = root_filter_regex.search(root).group(0)
-        if classname == in_dir:
-            # This means that instances are not further distributed into classes.
-            # Because of that, let all instancess have the same class '_ALL_'.
-            classname = "_ALL_"
-        for f in files:
-            if f.endswith(".log"):
-                file_list.append((root, classname, f))
+    stack = [in_dir]
+    while stack:
+        root = stack.pop()
+        subdirs, runs = listings[root]
+        classname = getClassName(root, in_dir)
+        for f, present in runs:
+            file_list.append((root, classname, f, present))
+        stack += [os.path.join(root, d) for d in reversed(subdirs)]
     return file_list
 
-def getResultsFromFileList(file_list):
+def getConfigName(in_dir):
+    in_dir = stripArchiveSuffix(in_dir)
     config = in_dir[-3:]
     idx = in_dir.rfind("_")
     if idx != -1:
         config = in_dir[idx+1:].rstrip("/")
-    
-    result_table = [getValuesFromLogAndOutFile(os.path.join(root, logfile)) + [classname, config] for root, classname, logfile in file_list]
-    return result_table
+    return config
+
+def parseRun(entry, profiling=False):
+    """
+    Parses an entry of the file list. Returns a list of (directory, values) for
+    all its runs, where directory is None for a run on disk and the directory
+    inside the archive for a run in an archive.
+    With 'profiling' returns also the timings (see getValuesFromLogAndOutFile).
+    """
+    root, classname, filename, present = entry
+    timings = {} if profiling else None
+    if present[0] == "tar":
+        runs = parseArchive(os.path.join(root, filename), present[1], timings=timings)
+    else:
+        runs = [(None, getValuesFromLogAndOutFile(os.path.join(root, filename), timings=timings, present=present))]
+    return (runs, timings) if profiling else runs
+
+def parseRuns(file_list, jobs=1, profile=None):
+    """
+    Parses all entries of 'file_list' and yields their runs (see parseRun) in the same order.
+
+    With jobs > 1 the runs are parsed by a pool of 'jobs' worker processes.
+    The file list is handed out in chunks, and the results are collected in
+    the original order, so the outcome is the same as in the serial case.
+
+    If 'profile' is given, the time spent on every file is recorded in it.
+    """
+    parse = parseRun if profile is None else partial(parseRun, profiling=True)
+    if jobs <= 1 or len(file_list) < 2:
+        results = map(parse, file_list)
+    else:
+        chunksize = max(1, min(1000, len(file_list) // (jobs * 16)))
+        pool = multiprocessing.Pool(jobs)
+        results = pool.imap(parse, file_list, chunksize)
+
+    try:
+        if profile is None:
+            yield from results
+            return
+        for (root, classname, filename, present), (runs, timings) in zip(file_list, results):
+            for source, (seconds, size) in timings.items():
+                profile.add("parse ." + source, seconds, 1, size)
+            profile.addFile(sum(seconds for seconds, size in timings.values()), os.path.join(root, filename),
+                            {source: size for source, (seconds, size) in timings.items()})
+            yield runs
+    finally:
+        if jobs > 1 and len(file_list) >= 2:
+            pool.terminate()
+
+cache_filename = ".parseresults_cache.db"
+cache_version = 3
+
+def getCachePath(in_dir, shard=None):
+    """
+    Returns the path of the parse cache of 'in_dir', which is separate for every shard (i, N).
+    """
+    name = cache_filename if shard is None else cache_filename + ".shard-%d-of-%d" % shard
+    if os.path.isdir(in_dir):
+        return os.path.join(in_dir, name)
+    return in_dir + name
+
+def getFileSignature(root, filename, present):
+    """
+    Returns [extension, size, mtime] of every file of the run (see getFileList),
+    or [size, mtime] of the archive.
+    """
+    if present[0] == "tar":
+        st = os.stat(os.path.join(root, filename))
+        return [st.st_size, st.st_mtime_ns]
+    stem = run_file_regex.match(filename).group(1)
+    signature = []
+    for suffix in present:
+        st = os.stat(os.path.join(root, stem + "." + suffix))
+        signature.append([suffix, st.st_size, st.st_mtime_ns])
+    return signature
+
+class ParseCache:
+    """
+    The index of previously parsed runs stored in a results directory: an SQLite database
+    mapping the path of the .log file of a run (or of an archive) to the signature of its
+    files (see getFileSignature) and the runs parsed from them (see parseRun).
+    It is looked up and updated one run at a time, so it is never held in memory as a whole.
+    """
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        with self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS meta (header TEXT)")
+            stored = self.db.execute("SELECT header FROM meta").fetchone()
+            version = self.db.execute("PRAGMA user_version").fetchone()[0]
+            if stored is None or json.loads(stored[0]) != header or version != cache_version:
+                self.db.execute("DROP TABLE IF EXISTS runs")
+                self.db.execute("DELETE FROM meta")
+                self.db.execute("INSERT INTO meta VALUES (?)", (json.dumps(header),))
+                self.db.execute("PRAGMA user_version = %d" % cache_version)
+            self.db.execute("CREATE TABLE IF NOT EXISTS runs (key TEXT PRIMARY KEY, signature TEXT, runs TEXT)")
+            self.db.execute("DROP TABLE IF EXISTS updated")
+
+    def signature(self, key):
+        row = self.db.execute("SELECT signature FROM runs WHERE key = ?", (key,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def runs(self, key):
+        return json.loads(self.db.execute("SELECT runs FROM runs WHERE key = ?", (key,)).fetchone()[0])
+
+    def __setitem__(self, key, entry):
+        signature, runs = entry
+        self.db.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?)", (key, json.dumps(signature), json.dumps(runs)))
+
+    def beginUpdate(self):
+        """
+        Starts collecting the runs of a new file list (see keep, add and setRuns),
+        which replace all runs in the index on finishUpdate.
+        """
+        self.db.execute("CREATE TABLE updated (key TEXT PRIMARY KEY, signature TEXT, runs TEXT)")
+
+    def keep(self, key):
+        self.db.execute("INSERT OR REPLACE INTO updated SELECT * FROM runs WHERE key = ?", (key,))
+
+    def add(self, key, signature):
+        self.db.execute("INSERT OR REPLACE INTO updated VALUES (?, ?, NULL)", (key, json.dumps(signature)))
+
+    def setRuns(self, key, runs):
+        self.db.execute("UPDATE updated SET runs = ? WHERE key = ?", (json.dumps(runs), key))
+
+    def finishUpdate(self):
+        self.db.execute("DROP TABLE runs")
+        self.db.execute("ALTER TABLE updated RENAME TO runs")
+
+    def save(self):
+        try:
+            self.db.commit()
+        except sqlite3.Error as e:
+            print("Warning: could not write the parse cache: %s" % e, file=sys.stderr)
+
+def loadCache(in_dir, shard=None):
+    """
+    Opens the index of previously parsed runs stored in 'in_dir', creating an empty one
+    if there is none or it was written for a different header. Returns None, without
+    caching, if it cannot be opened.
+    """
+    try:
+        return ParseCache(getCachePath(in_dir, shard))
+    except sqlite3.Error as e:
+        print("Warning: could not open the parse cache: %s" % e, file=sys.stderr)
+        return None
+
+def getResultsFromFileList(file_list, in_dir, jobs=1, cache=None, profile=None):
+    """
+    Yields the rows of the result table for the runs in 'file_list',
+    in the order of 'file_list'.
+
+    If 'cache' is given (see loadCache), runs whose files have the same
+    size and mtime as recorded in the cache are not parsed again, and neither
+    are unchanged archives. Once all rows have been yielded, the cache is updated
+    to describe exactly the runs in 'file_list' (see ParseCache.save to write it).
+    """
+    config = getConfigName(in_dir)
+
+    def rows(entry, runs):
+        root, classname = entry[0], entry[1]
+        for directory, run_values in runs:
+            if directory:
+                yield run_values + [getClassName(os.path.join(root, directory), in_dir), config]
+            else:
+                yield run_values + [classname, config]
+
+    if cache is None:
+        for entry, runs in zip(file_list, parseRuns(file_list, jobs, profile)):
+            yield from rows(entry, runs)
+        return
+
+    def key(entry):
+        return os.path.relpath(os.path.join(entry[0], entry[2]), in_dir)
+
+    # the signatures are taken before parsing and kept in the cache, not in memory
+    with profile.phase("cache check") if profile else nullcontext():
+        cache.beginUpdate()
+        reuse = []
+        for entry in file_list:
+            signature = getFileSignature(entry[0], entry[2], entry[3])
+            reuse.append(cache.signature(key(entry)) == signature)
+            if reuse[-1]:
+                cache.keep(key(entry))
+            else:
+                cache.add(key(entry), signature)
+    parsed = parseRuns([entry for entry, cached in zip(file_list, reuse) if not cached], jobs, profile)
+
+    for entry, cached in zip(file_list, reuse):
+        if cached:
+            runs = cache.runs(key(entry))
+        else:
+            runs = next(parsed)
+            cache.setRuns(key(entry), runs)
+        yield from rows(entry, runs)
+    cache.finishUpdate()
 
 def writeCSV(out_file, result_table):
     with open(out_file, "w") as f:
@@ -130,8 +560,45 @@ def writeCSV(out_file, result_table):
             print(*entry, sep=",", file=f)
     return None
 
+def spillRun(rows, chunk_size=1000):
+    f = tempfile.TemporaryFile()
+    for i in range(0, len(rows), chunk_size):
+        pickle.dump(rows[i:i+chunk_size], f, pickle.HIGHEST_PROTOCOL)
+    f.seek(0)
+    return f
+
+def readRun(f):
+    while True:
+        try:
+            chunk = pickle.load(f)
+        except EOFError:
+            return
+        yield from chunk
+
+def sortRows(rows, buffer_size=100000, key=itemgetter(0)):
+    """
+    Yields 'rows' in the same order as sorted(rows, key=key),
+    but keeps at most 'buffer_size' rows in memory. Whenever the buffer is full,
+    it is sorted and spilled to a temporary file, and at the end all sorted runs
+    are merged. Both the sort and the merge are stable, so ties keep their order.
+    """
+    runs = []
+    try:
+        buffer = []
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) >= buffer_size:
+                buffer.sort(key=key)
+                runs.append(spillRun(buffer))
+                buffer = []
+        buffer.sort(key=key)
+        yield from heapq.merge(*(readRun(f) for f in runs), buffer, key=key)
+    finally:
+        for f in runs:
+            f.close()
+
 def parseDirName(results_dir):
-    results_dir = results_dir.rstrip("/")
+    results_dir = stripArchiveSuffix(results_dir.rstrip("/"))
     results_dir = results_dir[results_dir.rfind("/") + 1:]
     if results_dir.startswith("results_"):
         results_dir = results_dir[8:]
@@ -142,23 +609,387 @@ def parseDirName(results_dir):
     else:
         return results_dir[idx+1:] + "_" + results_dir[:idx] + ".csv"
             
+class_idx = header.index("Class")
+config_idx = header.index("Configuration")
+
+# the output is sorted by this key, whether written at once, as partial outputs or by merge,
+# so merging the shards gives the same file as an unsharded run; merge detects duplicates on it
+merge_key = itemgetter(0, class_idx, config_idx)
+
+partial_magic = "#parseresults-partial "
+
+def parseShard(text):
+    """
+    Parses "i/N" into (i, N).
+    """
+    try:
+        i, n = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ArgumentTypeError("expected i/N, e.g. 0/4")
+    if not 0 <= i < n:
+        raise ArgumentTypeError("the shard i/N needs 0 <= i < N")
+    return i, n
+
+def shardOf(classname, name, shards):
+    """
+    Returns the shard among 'shards' that the run 'name' of class 'classname' belongs to.
+    """
+    return zlib.crc32((classname + "/" + name).encode()) % shards
+
+def inShard(entry, shard):
+    """
+    Tells whether a file list entry may have runs in the shard (i, N).
+    Archives may have runs in any shard.
+    """
+    root, classname, filename, present = entry
+    if present[0] == "tar":
+        return True
+    return shardOf(classname, run_file_regex.match(filename).group(1), shard[1]) == shard[0]
+
+def writePartial(out_file, rows, metadata):
+    """
+    Writes the rows of a shard with a first line holding the metadata as JSON.
+    """
+    with open(out_file, "w") as f:
+        f.write(partial_magic + json.dumps(metadata) + "\n")
+        print(",".join(header), file=f)
+        for row in rows:
+            print(*row, sep=",", file=f)
+
+def readPartial(filename):
+    """
+    Returns the metadata of a partial output, and an iterator over its rows.
+    """
+    f = open(filename)
+    line = f.readline()
+    if not line.startswith(partial_magic):
+        f.close()
+        print("Error: %s is not a partial output of parseresults.py --shard" % filename)
+        sys.exit(2)
+    metadata = json.loads(line[len(partial_magic):])
+    if next(f).rstrip("\n").split(",") != header or metadata.get("header") != header:
+        f.close()
+        print("Error: %s has different columns than this version of parseresults.py" % filename)
+        sys.exit(2)
+
+    def rows():
+        with f:
+            for line in f:
+                yield line.rstrip("\n").split(",")
+    return metadata, rows()
+
+def mergePartials(filenames, out_file=None, allow_missing=False):
+    """
+    Merges partial outputs of the shards of one or more configurations into one sorted CSV.
+    The shards of a configuration are grouped by the output file they would have written, so
+    the same configuration can be merged for several instance sets. Exits with an error if a
+    shard is missing (unless 'allow_missing') or given twice, or if a run occurs twice. The default
+    output file is the one the shards would have written without --shard, if they agree on it.
+    """
+    partials = [readPartial(filename) for filename in filenames]
+    shards = {}
+    for filename, (metadata, rows) in zip(filenames, partials):
+        dataset = "%s (%s)" % (metadata["config"], metadata["output"])
+        shards.setdefault((dataset, metadata["shards"]), {}).setdefault(metadata["shard"], []).append(filename)
+    datasets = [dataset for dataset, n in shards]
+    for dataset in set(datasets):
+        if datasets.count(dataset) > 1:
+            print("Error: the partial outputs of %s were split into different numbers of shards" % dataset)
+            sys.exit(2)
+    complete = True
+    for (dataset, n), found in sorted(shards.items()):
+        for i, names in sorted(found.items()):
+            if len(names) > 1:
+                print("Error: shard %d/%d of %s is given twice: %s" % (i, n, dataset, ", ".join(names)))
+                sys.exit(2)
+        missing = [i for i in range(n) if i not in found]
+        if missing:
+            complete = False
+            print("%s: missing shards %s of %d for %s" % ("Warning" if allow_missing else "Error", ", ".join(map(str, missing)), n, dataset))
+    if not complete and not allow_missing:
+        sys.exit(2)
+
+    if out_file is None:
+        outputs = {metadata["output"] for metadata, rows in partials}
+        out_file = outputs.pop() if len(outputs) == 1 else "results_merged.csv"
+
+    def merged():
+        previous = None
+        for row in heapq.merge(*(rows for metadata, rows in partials), key=merge_key):
+            if merge_key(row) == previous:
+                print("Error: duplicate run %s of class %s for config %s" % previous)
+                os.remove(out_file)
+                sys.exit(2)
+            previous = merge_key(row)
+            yield row
+
+    writeCSV(out_file, merged())
+    return out_file
+
+def mergeMain(argv):
+    parser = ArgumentParser(prog="parseresults.py merge", description="Merge the partial outputs of parseresults.py --shard into one sorted CSV.")
+    parser.add_argument("partials", nargs="+", help="The partial outputs of all shards.")
+    parser.add_argument("-o", "--outfile", type=str, default=None, help="Specify output file. The default is the output file of the shards without --shard.")
+    parser.add_argument("-m", "--allow-missing", action="store_true", default=False, help="Merge even if shards are missing.")
+    args = parser.parse_args(argv)
+    print(mergePartials(args.partials, args.outfile, args.allow_missing))
+
+class RunStats:
+    """
+    Running totals of the rows of a configuration, as printed by printStats of plotresults.py.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.statuses = {}
+        self.answers = {"10": 0, "20": 0}
+        self.solved_time = 0.0
+        # the shortest time of a run that timed out, and the longest time of any run, to guess the timeout
+        self.timed_out = math.inf
+        self.longest = 0.0
+
+    def add(self, row):
+        self.total += 1
+        status, result = row[status_idx], row[result_idx]
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        try:
+            seconds = float(row[time_idx])
+        except ValueError:
+            return
+        if result in self.answers:
+            self.answers[result] += 1
+            self.solved_time += seconds
+        if status == "time":
+            self.timed_out = min(self.timed_out, seconds)
+        self.longest = max(self.longest, seconds)
+
+    def addRows(self, rows):
+        """
+        Adds the rows and yields them again, like ColumnBuilder.addRows.
+        """
+        for row in rows:
+            self.add(row)
+            yield row
+
+    def guessTimeout(self):
+        if self.timed_out < math.inf:
+            return int(self.timed_out)
+        return int(self.longest) + 1
+
+    def report(self, config, timeout=None, file=sys.stdout):
+        timeout = timeout or self.guessTimeout()
+        unsolved = self.total - sum(self.answers.values())
+        par10 = (self.solved_time + timeout * 10 * unsolved) / self.total if self.total else 0
+        print("####################" + "#" * 15 + "##", file=file)
+        print("# Configuration:    %15s #" % config, file=file)
+        print("####################" + "#" * 15 + "##", file=file)
+        print("# Total instances:  %15d #" % self.total, file=file)
+        print("# Instances solved: %15d #" % self.statuses.get("ok", 0), file=file)
+        print("# SAT:              %15d #" % self.answers["10"], file=file)
+        print("# UNSAT:            %15d #" % self.answers["20"], file=file)
+        print("# Timeouts:         %15d #" % self.statuses.get("time", 0), file=file)
+        print("# Memory outs:      %15d #" % self.statuses.get("memory", 0), file=file)
+        print("# Faults:           %15d #" % self.statuses.get("fault", 0), file=file)
+        print("# Signals:          %15d #" % self.statuses.get("signal(9)", 0), file=file)
+        print("#                   " + " " * 15 + " #", file=file)
+        print("# PAR10:            %15d #" % par10, file=file)
+        print("####################" + "#" * 15 + "##", file=file)
+        file.flush()
+
+def completedRows(rows, running):
+    """
+    Yields the rows of the completed runs, adding (class, run name) of the others to 'running'.
+    """
+    for row in rows:
+        if row[status_idx] == "NA":
+            running.add((row[class_idx], row[0]))
+        else:
+            yield row
+
+def findRun(root, stem, in_dir):
+    """
+    Returns the entry of the file list (see getFileList) of the run 'stem' in the directory 'root',
+    or None if the run has no .log file.
+    """
+    present = []
+    for source in sources:
+        for compression in [""] + list(compressions):
+            if os.path.isfile(os.path.join(root, stem + "." + source + compression)):
+                present.append(source + compression)
+                break
+    if not present or not present[0].startswith("log"):
+        return None
+    return (root, getClassName(root, in_dir), stem + "." + present[0], tuple(present))
+
+def watchResults(in_dir, out_file, known, stats, cache=None, interval=2.0, jobs=1, threads=8, timeout=None):
+    """
+    Watches 'in_dir' until interrupted and appends the rows of the runs that complete
+    to 'out_file', printing the updated 'stats' after every batch of new rows.
+    'known' is the set of (directory, run name) of the runs already in 'out_file',
+    which are not parsed again. A run is complete once its .log file has a status.
+
+    The tree is watched with inotify if available, so only the runs whose files are
+    written are looked at. Otherwise the tree is listed every 'interval' seconds.
+    New runs are added to 'cache'. Runs in tar archives are not watched.
+    """
+    config = getConfigName(in_dir)
+    try:
+        notifier = Inotify()
+    except OSError:
+        notifier = None
+    # (directory, run name) of the runs that may have completed
+    pending = set()
+
+    def watchTree(top):
+        # a directory is listed only after it is watched, so no run written in between is missed
+        stack = [top]
+        while stack:
+            root = stack.pop()
+            try:
+                notifier.add(root)
+            except OSError:
+                continue
+            subdirs, runs = listDirectory(root)
+            pending.update((root, run_file_regex.match(f).group(1)) for f, present in runs if present[0] != "tar")
+            stack += [os.path.join(root, d) for d in subdirs]
+
+    if notifier is not None:
+        # also catches the runs completed since the output file was written
+        watchTree(in_dir)
+    print("Watching %s %s" % (in_dir, "with inotify" if notifier is not None else "every %g seconds" % interval), file=sys.stderr)
+    try:
+        while True:
+            if notifier is None:
+                time.sleep(interval)
+                pending.update((root, run_file_regex.match(f).group(1)) for root, classname, f, present in getFileList(in_dir, threads) if present[0] != "tar")
+            else:
+                events = notifier.read(interval)
+                if events is None:
+                    # events were lost, look at the whole tree again
+                    watchTree(in_dir)
+                    events = []
+                for path, is_dir in events:
+                    directory, name = os.path.split(path)
+                    if name[0] == ".":
+                        continue
+                    if is_dir:
+                        watchTree(path)
+                        continue
+                    match = run_file_regex.match(name)
+                    if match:
+                        pending.add((directory, match.group(1)))
+
+            candidates = [findRun(root, stem, in_dir) for root, stem in sorted(pending - known)]
+            candidates = [entry for entry in candidates if entry is not None]
+            pending.clear()
+            rows = []
+            for (root, classname, logfile, present), runs in zip(candidates, parseRuns(candidates, jobs)):
+                values = runs[0][1]
+                if values[status_idx] == "NA":
+                    # still running
+                    continue
+                known.add((root, values[0]))
+                rows.append(values + [classname, config])
+                if cache is not None:
+                    cache[os.path.relpath(os.path.join(root, logfile), in_dir)] = [getFileSignature(root, logfile, present), runs]
+            if rows:
+                with open(out_file, "a") as f:
+                    for row in rows:
+                        print(*row, sep=",", file=f)
+                for row in rows:
+                    stats.add(row)
+                print("%d new runs, %d in total" % (len(rows), stats.total))
+                stats.report(config, timeout)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if notifier is not None:
+            notifier.close()
+
 if __name__ == '__main__':
-    parser = ArgumentParser()
-    parser.add_argument("results_dir", help="Directory containing (possibly in deeper subdirectories) all .log, .out, and .err files.")
+    if sys.argv[1:2] == ["merge"]:
+        mergeMain(sys.argv[2:])
+        sys.exit(0)
+
+    parser = ArgumentParser(epilog="Use 'parseresults.py merge PARTIAL...' to merge the partial outputs of --shard.")
+    parser.add_argument("results_dir", help="Directory containing (possibly in deeper subdirectories) all .log, .out, and .err files, which may be compressed or packed in tar archives. Can also be a tar archive of such a directory.")
     parser.add_argument("-o", "--outfile", type=str, default=None, help="Specify output file. The default is to guess <inst_set> and <config> and write to <config>_<inst_set>.csv.")
     parser.add_argument("-g", "--general", action="store_true", default=False, help="Do not parse auxiliary information from .out and .log files.")
+    parser.add_argument("-n", "--no-cache", action="store_true", default=False, help="Neither use nor update the index of parsed runs stored in results_dir (%s)." % cache_filename)
+    parser.add_argument("-b", "--buffer-size", type=int, default=100000, help="Maximum number of rows kept in memory while sorting. Larger tables are sorted in runs on disk. The default is 100000.")
+    parser.add_argument("-B", "--binary", action="store_true", default=False, help="Also write the binary companion of the output file (<outfile>.bin) that plotresults.py loads instead of the CSV.")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of worker processes used for parsing. 0 means one per CPU. The default is 1.")
+    parser.add_argument("-t", "--threads", type=int, default=8, help="Number of threads listing the directories of results_dir. The default is 8.")
+    parser.add_argument("-p", "--profile", type=int, nargs="?", const=10, default=None, metavar="N", help="Print the time spent in every phase and the N slowest runs to parse (default 10) as JSON to stderr.")
+    parser.add_argument("-s", "--shard", type=parseShard, default=None, metavar="i/N", help="Parse only the runs in shard i of N, chosen by a hash of class and instance, and write a partial output (<outfile>.shard-i-of-N) for 'parseresults.py merge'.")
+    parser.add_argument("-w", "--watch", type=float, nargs="?", const=2.0, default=None, metavar="SECONDS", help="After writing the output file, keep watching results_dir, append the rows of runs as they complete and print the running statistics, until interrupted. Uses inotify where available, and otherwise lists results_dir every SECONDS (default 2).")
+    parser.add_argument("--timeout", type=int, default=None, help="The time limit of the runs, for the PAR10 printed by --watch. By default it is guessed like plotresults.py does.")
     args = parser.parse_args()
+    if args.shard is not None and (args.binary or args.watch is not None):
+        parser.error("--shard writes a partial output, which cannot be combined with --binary or --watch")
+
+    profile = None if args.profile is None else Profile(args.profile)
+    phase = profile.phase if profile else lambda name, inner=(): nullcontext()
 
     in_dir = args.results_dir
     out_file = args.outfile
     if out_file == None:
         out_file = parseDirName(args.results_dir)
+    if args.shard is not None:
+        partial_file = out_file + ".shard-%d-of-%d" % args.shard
+
+    jobs = args.jobs
+    if jobs <= 0:
+        jobs = multiprocessing.cpu_count()
+
+    with phase("cache load"):
+        cache = None if args.no_cache else loadCache(in_dir, args.shard)
 
-    file_list = getFileList(in_dir)
-    writeCSV(out_file, sorted(getResultsFromFileList(file_list), key=itemgetter(0)))
+    with phase("walk"):
+        file_list = getFileList(in_dir, args.threads)
+    if args.shard is not None:
+        file_list = [entry for entry in file_list if inShard(entry, args.shard)]
+        started = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    result_table = getResultsFromFileList(file_list, in_dir, jobs, cache, profile)
+    if args.shard is not None:
+        # the runs of archives are only sorted out here
+        result_table = (row for row in result_table if shardOf(row[class_idx], row[0], args.shard[1]) == args.shard[0])
+    if profile:
+        result_table = profile.iterate("parse", result_table, inner=["cache check"])
+    result_table = sortRows(result_table, args.buffer_size, merge_key)
+    if profile:
+        result_table = profile.iterate("sort", result_table, inner=["cache check", "parse"])
+    if args.watch is not None:
+        # the runs still running are left to the watcher
+        running = set()
+        result_table = completedRows(result_table, running)
+        stats = RunStats()
+        result_table = stats.addRows(result_table)
+    if args.binary:
+        builder = ColumnBuilder()
+        result_table = builder.addRows(result_table, header)
+    with phase("write", inner=["cache check", "parse", "sort"]):
+        if args.shard is None:
+            writeCSV(out_file, result_table)
+        else:
+            metadata = {"shard": args.shard[0], "shards": args.shard[1], "config": getConfigName(in_dir), "output": out_file,
+                        "results_dir": os.path.abspath(in_dir), "host": socket.gethostname(), "started": started,
+                        "header": header, "sources": [os.path.relpath(os.path.join(root, filename), in_dir) for root, classname, filename, present in file_list]}
+            writePartial(partial_file, result_table, metadata)
+    if args.binary:
+        with phase("binary write"):
+            writeBinary(binaryName(out_file), builder.columns, builder.dictionaries(), os.path.getsize(out_file))
+    if cache is not None:
+        with phase("cache save"):
+            cache.save()
 
-    #num_proc = multiprocessing.cpu_count()
-    #sliced_file_lists = [file_list[r::num_proc] for r in range(num_proc)]
+    if profile:
+        profile.report()
 
-    #with multiprocessing.Pool(num_proc) as p:
-    #    writeCSV(out_file, [elem for table in p.map(getResultsFromFileList, sliced_file_lists) for elem in table])
+    if args.watch is not None:
+        stats.report(getConfigName(in_dir), args.timeout)
+        known = {(root, run_file_regex.match(f).group(1)) for root, classname, f, present in file_list
+                 if present[0] != "tar" and (classname, run_file_regex.match(f).group(1)) not in running}
+        watchResults(in_dir, out_file, known, stats, cache, args.watch, jobs, args.threads, args.timeout)
+        if cache is not None:
+            cache.save()
@@ -6,121 +6,302 @@ Created on Thu Feb  2 10:52:13 2017
 @author: peitl
 """
 
-import sys
-import math
-from argparse import ArgumentParser
-from operator import itemgetter
-from statistics import pvariance, pstdev, mean
-from collections import defaultdict
+import os, sys
+import glob
+import shlex
+import time
+import multiprocessing
+from argparse import ArgumentParser, ArgumentTypeError
+from contextlib import nullcontext, redirect_stdout
+
+import numpy as np
+
+from binresults import ColumnBuilder, column_types, readBinary, writeBinary, binaryName
+from profiling import Profile
+from plotserver import default_address, server_variable, servable, serve, query
 
 colors = ["r", "g", "b", "y"] * 90
 styles = ["-", "--", ":"] * 120
 
+class RunData:
+    """
+    Columnar store of the run data of all configurations on all instances.
+
+    Configurations, classes and instances are identified by integer ids:
+    the indices into 'configurations', 'classes' and 'instance_names'.
+    Instances are numbered by class and then by name, so the instances of
+    class k are the ids class_start[k]:class_start[k+1].
+
+        answer = int8[config, instance], 1 for True (SAT), 0 for False (UNSAT), -1 for no answer
+        time   = float64[config, instance]
+        status = int8[config, instance], index into 'statuses', -1 if there is no entry
+
+    Intermediates that several analyses need are computed once and kept (see memoized).
+    """
+
+    def __init__(self, configurations, classes, instance_names, instance_class, answer, time, status, statuses):
+        self.configurations = configurations
+        self.classes = classes
+        self.instance_names = instance_names
+        self.instance_class = instance_class
+        self.class_start = np.searchsorted(instance_class, np.arange(len(classes) + 1))
+        self.answer = answer
+        self.time = time
+        self.status = status
+        self.statuses = statuses
+        self.memo = {}
+
+    def __len__(self):
+        return int(np.count_nonzero(self.status >= 0))
+
+    def memoized(self, key, compute):
+        """
+        Returns compute(), calling it only the first time the intermediate 'key' is asked for.
+        """
+        if key not in self.memo:
+            self.memo[key] = compute()
+        return self.memo[key]
+
+    @property
+    def solved(self):
+        return self.memoized("solved", lambda: self.answer >= 0)
+
+    def instanceLabels(self):
+        return self.memoized("labels", lambda: [self.classes[k] + "/" + name for k, name in zip(self.instance_class.tolist(), self.instance_names)])
+
+    def penalizedTimes(self, timeout, factor=10):
+        """
+        Returns the times with unsolved instances counted as 'factor' times the timeout, as for PAR10.
+        """
+        return self.memoized(("penalized times", timeout, factor), lambda: np.where(self.solved, self.time, timeout*factor))
+
+    def solvedTimes(self, j):
+        """
+        Returns the sorted times of the instances solved by configuration j.
+        """
+        return self.memoized(("solved times", j), lambda: np.sort(self.time[j, self.solved[j]]))
+
+    def statusCounts(self, j):
+        counts = np.bincount(self.status[j][self.status[j] >= 0], minlength=len(self.statuses))
+        return dict(zip(self.statuses, counts.tolist()))
+
 def printStats(classes, configurations, instances, rundata, timeout):
-    stats = {True: 0, False: 0, "time": 0, "memory": 0, "fault": 0, "signal(9)": 0}
-    par10 = 0
     for j, config in enumerate(configurations):
-        par10 = 0
-        total = 0
-        stats[True] = stats[False] = stats["ok"] = stats["time"] = stats["memory"] = stats["fault"] = stats["signal(9)"] = 0
-        for classname in classes:
-            for instance in instances[classname]:
-                total += 1
-                ans, time, status = rundata[getUID(config, classname, instance)]
-                stats[status] += 1
-                if ans != None:
-                    stats[ans] += 1
-                    par10 += time
-                else:
-                    par10 += timeout*10
-        if stats["ok"] != stats[True] + stats[False]:
+        total = rundata.answer.shape[1]
+        stats = rundata.statusCounts(j)
+        stats[True] = int(np.count_nonzero(rundata.answer[j] == 1))
+        stats[False] = int(np.count_nonzero(rundata.answer[j] == 0))
+        par10 = rundata.penalizedTimes(timeout)[j].sum()
+        if stats.get("ok", 0) != stats[True] + stats[False]:
             print("WARNING: not all 'ok' instances have an answer!")
         print("####################" + "#" * 15 + "##")
         print("# Configuration:    %15s #" % config)
         print("####################" + "#" * 15 + "##")
         print("# Total instances:  %15d #" % total)
-        print("# Instances solved: %15d #" % stats["ok"])
+        print("# Instances solved: %15d #" % stats.get("ok", 0))
         print("# SAT:              %15d #" % stats[True])
         print("# UNSAT:            %15d #" % stats[False])
-        print("# Timeouts:         %15d #" % stats["time"])
-        print("# Memory outs:      %15d #" % stats["memory"])
-        print("# Faults:           %15d #" % stats["fault"])
-        print("# Signals:          %15d #" % stats["signal(9)"])
+        print("# Timeouts:         %15d #" % stats.get("time", 0))
+        print("# Memory outs:      %15d #" % stats.get("memory", 0))
+        print("# Faults:           %15d #" % stats.get("fault", 0))
+        print("# Signals:          %15d #" % stats.get("signal(9)", 0))
         print("#                   " + " " * 15 + " #")
         print("# PAR10:            %15d #" % (par10/total))
     print("####################" + "#" * 15 + "##")
 
-def cactusPlot(classes, configurations, instances, rundata, timeout):
-    maxLenX = 0
-    for j, config in enumerate(configurations):
-        for k, classname in enumerate(classes):
-            times = sorted((rundata[getUID(config, classname, instance)][1] for instance in instances[classname]))
-            X = range(1, len(times) + 1)
-            if len(X) > maxLenX:
-                maxLenX = len(X)
-            label = config
-            if classname != "_ALL_":
-                label = classname + "-" + config
-            mp.plot(X, times, colors[k] + styles[j], label=label)
+def importPyplot(headless=False):
+    """
+    Imports matplotlib.pyplot as the global mp, with the Agg backend if 'headless',
+    which renders to files without a display.
+    """
+    global mp
+    if headless:
+        import matplotlib
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as mp
+
+def showOrSave(filename=None):
+    if filename is None:
+        mp.show()
+    else:
+        mp.savefig(filename)
+        mp.close()
+
+def decimateCurve(x, y, xlim, ylim, pixels=4000):
+    """
+    Returns the points of the monotone curve (x, y) needed to draw it on a grid
+    of 'pixels' x 'pixels' cells over the axes limits 'xlim' and 'ylim':
+    the first and last point in every cell the curve passes through.
+    """
+    if len(x) <= 2:
+        return x, y
+    def cells(values, lim):
+        scale = pixels / max(lim[1] - lim[0], 1e-300)
+        return np.clip(((values - lim[0]) * scale).astype(np.int64), -1, pixels)
+    cell = cells(x, xlim) * (pixels + 2) + cells(y, ylim)
+    change = np.flatnonzero(cell[1:] != cell[:-1])
+    keep = np.unique(np.concatenate([[0, len(x) - 1], change, change + 1]))
+    return x[keep], y[keep]
+
+def renderCactus(filename, curves, xmax, ymax):
+    """
+    Plots the cactus curves, a list of (x, y, style, label), and shows the plot or saves it to 'filename'.
+    """
+    for x, y, style, label in curves:
+        mp.plot(x, y, style, label=label)
     mp.legend(loc=0, borderaxespad=0.5)
-    mp.axis([0, maxLenX + 1, 0, timeout + 1])
-    mp.show()
-
-def analyzeFamilies(classes, configurations, instances, rundata):
-    family_data = []
-    for classname in classes:
-        solved = [0] * len(configurations)
-        for instance in instances[classname]:
-            for i, config in enumerate(configurations):
-                if rundata[getUID(config, classname, instance)][0] != None:
-                    solved[i] += 1
-        mu = mean(solved)
-        if mu == 0:
-            print("No solver solved anything from the family '%s'" % classname)
+    mp.axis([0, xmax, 0, ymax])
+    showOrSave(filename)
+
+def renderCactusHeadless(figure):
+    importPyplot(True)
+    renderCactus(*figure)
+
+def cactusPlot(classes, configurations, instances, rundata, timeout, filename=None, split=None, jobs=1):
+    """
+    Makes a cactus plot of every configuration on every class, or with 'split' set to
+    "class" or "config", one plot per class or configuration, named 'filename' with the
+    class or configuration appended. The curves are decimated to the points that show.
+    If 'filename' is given the plots are saved, by up to 'jobs' processes, instead of shown,
+    and the names of the files are returned.
+    """
+    if split == "class":
+        groups = [([k], range(len(configurations)), "-" + classname) for k, classname in enumerate(classes)]
+    elif split == "config":
+        groups = [(range(len(classes)), [j], "-" + config) for j, config in enumerate(configurations)]
+    else:
+        groups = [(range(len(classes)), range(len(configurations)), "")]
+
+    figures = []
+    for class_ids, config_ids, suffix in groups:
+        maxLenX = max(rundata.class_start[k+1] - rundata.class_start[k] for k in class_ids)
+        xlim, ylim = (0, maxLenX + 1), (0, timeout + 1)
+        curves = []
+        for j in config_ids:
+            for k in class_ids:
+                times = np.sort(rundata.time[j, rundata.class_start[k]:rundata.class_start[k+1]])
+                X = np.arange(1, len(times) + 1)
+                label = configurations[j]
+                if classes[k] != "_ALL_":
+                    label = classes[k] + "-" + configurations[j]
+                curves.append(decimateCurve(X, times, xlim, ylim) + (colors[k] + styles[j], label))
+        if filename is not None:
+            base, extension = os.path.splitext(filename)
+            figures.append((base + suffix + extension, curves, xlim[1], ylim[1]))
         else:
-            std = pstdev(solved, mu)
-            relstd = std / mu
-            relvar = pvariance(solved, mu) / mu
-            #family_data.append([classname, std, relstd] + solved)
-            family_data.append([classname, relvar] + solved)
-    family_data.sort(key=lambda x: x[1], reverse=True)
-    longest_name = max((len(family[0]) for family in family_data))
-    #format_string = "%{}s ".format(longest_name) + "%{}.2f ".format(len("stddev")) + "%{}.2f ".format(len("reldev")) + " ".join(("%{}d".format(len(config)) for config in configurations))
-    format_string = "%{}s ".format(longest_name) + "%{}.2f ".format(len("relvar")) + " ".join(("%{}d".format(len(config)) for config in configurations))
+            figures.append((None, curves, xlim[1], ylim[1]))
+
+    if filename is not None and jobs > 1 and len(figures) > 1:
+        with multiprocessing.Pool(min(jobs, len(figures))) as p:
+            p.map(renderCactusHeadless, figures, 1)
+    else:
+        for figure in figures:
+            renderCactus(*figure)
+    if filename is not None:
+        return [figure[0] for figure in figures]
+
+def topIndices(scores, k=None):
+    """
+    Returns the indices of the k largest scores, largest first and equal scores by index,
+    or of all scores if k is None. NaN scores come last.
+    Only the k selected scores are sorted, after a partial selection.
+    """
+    keys = np.where(np.isnan(scores), -np.inf, scores)
+    if k is None or k >= len(keys):
+        return np.argsort(-keys, kind="stable")
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    threshold = np.partition(keys, len(keys) - k)[len(keys) - k]
+    above = np.flatnonzero(keys > threshold)
+    ties = np.flatnonzero(keys == threshold)[:k - len(above)]
+    chosen = np.concatenate([above, ties])
+    return chosen[np.lexsort((chosen, -keys[chosen]))]
+
+def logTimes(rundata):
+    # times below 0.01 seconds count as 0.01, so that the log is defined
+    return rundata.memoized("log times", lambda: np.log10(np.maximum(rundata.time, 0.01)))
+
+def dispersion(values, metric):
+    """
+    Returns the dispersion of 'values' over the configurations (axis 0) by 'metric':
+    "stddev", "relvar" (variance / mean) or "logspread" (stddev of the log10 of the values).
+    """
+    if metric == "stddev":
+        return values.std(axis=0)
+    if metric == "relvar":
+        mu = values.mean(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return values.var(axis=0) / mu
+    if metric == "logspread":
+        return np.log10(np.maximum(values, 0.01)).std(axis=0)
+    raise ValueError("unknown metric '%s'" % metric)
+
+def analyzeFamilies(classes, configurations, instances, rundata, top=None, metric="relvar"):
+    """
+    Prints the 'top' families (all if None) with the largest dispersion of the number
+    of instances solved by the configurations, measured by 'metric' (see dispersion).
+    With "logspread" the dispersion is that of the mean log10 runtime of the configurations on the family.
+    """
+    # solved[i, k] = number of instances of class k solved by configuration i
+    solved = np.add.reduceat(rundata.solved.astype(np.int64), rundata.class_start[:-1], axis=1)
+    if metric == "logspread":
+        sizes = np.diff(rundata.class_start)
+        scores = (np.add.reduceat(logTimes(rundata), rundata.class_start[:-1], axis=1) / sizes).std(axis=0)
+    else:
+        scores = dispersion(solved, metric)
+    unsolved = solved.sum(axis=0) == 0
+    for k in np.flatnonzero(unsolved).tolist():
+        print("No solver solved anything from the family '%s'" % classes[k])
+    candidates = np.flatnonzero(~unsolved)
+    order = candidates[topIndices(scores[candidates], top)]
+    longest_name = max((len(classes[k]) for k in order.tolist()))
+    format_string = "%{}s ".format(longest_name) + "%{}.2f ".format(len(metric)) + " ".join(("%{}d".format(len(config)) for config in configurations))
     format_string_header = "%{}s ".format(longest_name) + "%s " + "%s " * len(configurations)
     print()
     print("Families with the highest discrepancies:")
     print()
-    print(format_string_header % (("family", "relvar") + tuple(configurations)))
-    for family in family_data:
-        print(format_string % tuple(family))
-
-def findOutliers(classes, configurations, instances, rundata):
-    outliers = []
-    for classname in classes:
-        for instance in instances[classname]:
-            runtime_list = [rundata[getUID(config, classname, instance)][1] for config in configurations]
-            outliers.append((instance, pstdev(runtime_list), *runtime_list))
-    outliers.sort(key=itemgetter(1), reverse=True)
-    longest_name = max((len(x[0]) for x in outliers))
-    format_string = "%{}s ".format(longest_name) + "%{}.2f ".format(len("stddev")) + " ".join(("%{}.2f".format(len(config)) for config in configurations))
+    print(format_string_header % (("family", metric) + tuple(configurations)))
+    for k, score, counts in zip(order.tolist(), scores[order].tolist(), solved[:, order].T.tolist()):
+        print(format_string % (classes[k], score, *counts))
+
+def findOutliers(classes, configurations, instances, rundata, top=None, metric="stddev"):
+    """
+    Prints the 'top' instances (all if None) with the largest dispersion of the runtimes
+    of the configurations, measured by 'metric' (see dispersion).
+    """
+    if metric == "logspread":
+        scores = logTimes(rundata).std(axis=0)
+    else:
+        scores = dispersion(rundata.time, metric)
+    order = topIndices(scores, top)
+    longest_name = max((len(name) for name in rundata.instance_names))
+    format_string = "%{}s ".format(longest_name) + "%{}.2f ".format(len(metric)) + " ".join(("%{}.2f".format(len(config)) for config in configurations))
     format_string_header = "%{}s ".format(longest_name) + "%s " + "%s " * len(configurations)
-    print(format_string_header % (("name", "stddev") + tuple(configurations)))
-    for x in outliers:
-        print(format_string % tuple(x))
+    print(format_string_header % (("name", metric) + tuple(configurations)))
+    for i, score, times in zip(order.tolist(), scores[order].tolist(), rundata.time[:, order].T.tolist()):
+        print(format_string % (rundata.instance_names[i], score, *times))
 
-def scatterPlot(classes, configurations, instances, rundata, timeout):
+def scatterPlot(classes, configurations, instances, rundata, timeout, filename=None, usetex=False, hexbin=10000):
+    """
+    Plots the times of the 2 configurations against each other, as a density
+    of hexagonal bins if there are more than 'hexbin' instances.
+    Labels are typeset with LaTeX if 'usetex' is set.
+    """
     assert(len(configurations) == 2)
-    instance_times = [[], []]
-    for classname in classes:
-        for instance in instances[classname]:
-            for i, config in enumerate(configurations):
-                instance_times[i].append(rundata[getUID(config, classname, instance)][1])
-    mp.rc("font", family="serif", serif=["Computer Modern"])
-    mp.rc("text", usetex=True)
-    mp.scatter(*instance_times)
+    instance_times = rundata.time
+    if usetex:
+        mp.rc("font", family="serif", serif=["Computer Modern"])
+        mp.rc("text", usetex=True)
+    l, u = instance_times.min() / 5, instance_times.max() * 5
+    if instance_times.shape[1] > hexbin:
+        # the log scale needs positive times
+        lowest = instance_times[instance_times > 0].min(initial=timeout) / 5
+        mp.hexbin(*np.maximum(instance_times, lowest), xscale="log", yscale="log", bins="log", mincnt=1)
+        mp.colorbar(label="instances")
+        l = max(l, lowest)
+    else:
+        mp.scatter(*instance_times)
     mp.plot([0, timeout*10], [0, timeout*10])
-    l, u = min(min(instance_times)) / 5, max(max(instance_times)) * 5
     mp.xlim(l, u)
     mp.ylim(l, u)
     mp.gca().set_aspect('equal', adjustable='box')
@@ -128,89 +309,479 @@ def scatterPlot(classes, configurations, instances, rundata, timeout):
     mp.gca().set_yscale("log")
     mp.xlabel(configurations[0])
     mp.ylabel(configurations[1])
-    mp.show()
+    showOrSave(filename)
+
+def resampleWeights(rng, n, resamples):
+    """
+    Returns int64[resamples, n], how often each of n items is drawn in each of
+    'resamples' draws of n items with replacement.
+    """
+    draws = rng.integers(0, n, size=(resamples, n))
+    draws += (np.arange(resamples) * n)[:, None]
+    return np.bincount(draws.ravel(), minlength=resamples * n).reshape(resamples, n)
+
+def winProbabilities(values, larger_wins):
+    """
+    Returns p[i, j] = the fraction of the rows of 'values' (resamples x configs)
+    in which config i beats config j.
+    """
+    if larger_wins:
+        return (values[:, :, None] > values[:, None, :]).mean(axis=0)
+    return (values[:, :, None] < values[:, None, :]).mean(axis=0)
+
+def bootstrap(classes, configurations, instances, rundata, timeout, resamples=10000, confidence=0.95, seed=None, batch_size=1 << 22):
+    """
+    Estimates confidence intervals of the number of solved instances and the PAR10
+    of every configuration, overall and per family, by resampling the instances
+    with replacement, the same instances for all configurations (a paired bootstrap).
+    The instances are resampled within each family, so the families keep their size.
+
+    Every batch of resamples is drawn as a matrix of weights (how often every
+    instance is drawn), and the statistics of the whole batch are a product of
+    that matrix with the solved matrix and the penalized times, with at most
+    'batch_size' weights at a time.
+
+    Prints the intervals and, for every pair of configurations, the fraction of
+    resamples in which one solves more instances or has a lower PAR10 than the other, as CSV.
+    """
+    rng = np.random.default_rng(seed)
+    n_configs = len(configurations)
+    n_instances = rundata.solved.shape[1]
+    penalized = rundata.penalizedTimes(timeout)
+    # the solved matrix and the penalized times, to be weighted by one product
+    scores = np.concatenate([rundata.solved.astype(np.float64), penalized])
+    quantiles = [(1 - confidence) / 2, (1 + confidence) / 2]
+
+    # the totals over all families of every resample
+    total_solved = np.zeros((resamples, n_configs))
+    total_penalized = np.zeros((resamples, n_configs))
+    family_intervals = []
+    for k, classname in enumerate(classes):
+        start, end = rundata.class_start[k], rundata.class_start[k+1]
+        n = end - start
+        family_solved = np.empty((resamples, n_configs))
+        chunk = max(1, batch_size // max(n, 1))
+        for first in range(0, resamples, chunk):
+            last = min(resamples, first + chunk)
+            weighted = resampleWeights(rng, n, last - first) @ scores[:, start:end].T
+            family_solved[first:last] = weighted[:, :n_configs]
+            total_penalized[first:last] += weighted[:, n_configs:]
+        total_solved += family_solved
+        family_intervals.append(np.quantile(family_solved, quantiles, axis=0))
+
+    total_par10 = total_penalized / n_instances
+    solved_intervals = np.quantile(total_solved, quantiles, axis=0)
+    par10_intervals = np.quantile(total_par10, quantiles, axis=0)
+    par10 = penalized.sum(axis=1) / n_instances
+
+    print("Bootstrap with %d resamples within the families, %g%% confidence intervals" % (resamples, 100 * confidence))
+    print()
+    print("config,solved,solved_low,solved_high,par10,par10_low,par10_high")
+    for j, config in enumerate(configurations):
+        print("%s,%d,%g,%g,%.2f,%.2f,%.2f" % (config, rundata.solved[j].sum(), *solved_intervals[:, j], par10[j], *par10_intervals[:, j]))
+
+    for title, probabilities in (("Probability that the row config solves more instances than the column config", winProbabilities(total_solved, True)),
+                                 ("Probability that the row config has a lower PAR10 than the column config", winProbabilities(total_par10, False))):
+        print()
+        print(title)
+        print("config," + ",".join(configurations))
+        for config, row in zip(configurations, probabilities.tolist()):
+            print(config + "," + ",".join("%.4f" % p for p in row))
+
+    print()
+    print("family,config,solved,solved_low,solved_high")
+    for k, classname in enumerate(classes):
+        family = rundata.solved[:, rundata.class_start[k]:rundata.class_start[k+1]].sum(axis=1)
+        for j, config in enumerate(configurations):
+            print("%s,%s,%d,%g,%g" % (classname, config, family[j], *family_intervals[k][:, j]))
+
+def portfolio(classes, configurations, instances, rundata, timeout, size=None, criterion="par10"):
+    """
+    Prints the virtual best solver, which on every instance takes the shortest runtime
+    of any configuration, and how often every configuration is the fastest.
+
+    Then greedily chooses a portfolio of 'size' configurations (all if None or not positive) to run in parallel:
+    every step adds the configuration that improves the portfolio most, by the PAR10 or by the
+    number of solved instances ('criterion'), the other breaking ties. The portfolio runs each
+    instance as fast as its fastest configuration, which is updated after every step.
+    """
+    penalized = rundata.penalizedTimes(timeout)
+    solved = rundata.solved
+    n_instances = solved.shape[1]
+    if n_instances == 0 or len(configurations) == 0:
+        print("portfolio: no runs")
+        return
+
+    fastest = penalized.argmin(axis=0)
+    best_on = np.bincount(fastest[solved.any(axis=0)], minlength=len(configurations))
+    print("Virtual best solver: %d solved, PAR10 %.2f" % (np.count_nonzero(solved.any(axis=0)), penalized.min(axis=0).mean()))
+    print()
+    print("config,solved,par10,fastest_on")
+    for j, config in enumerate(configurations):
+        print("%s,%d,%.2f,%d" % (config, np.count_nonzero(solved[j]), penalized[j].mean(), best_on[j]))
+
+    size = len(configurations) if size is None or size <= 0 else min(size, len(configurations))
+    # the runtime and solved instances of the portfolio chosen so far
+    best_time = np.full(n_instances, timeout * 10.0)
+    best_solved = np.zeros(n_instances, dtype=bool)
+    chosen = np.zeros(len(configurations), dtype=bool)
+    par10, n_solved = timeout * 10.0, 0
+    print()
+    print("Portfolio chosen greedily by %s" % criterion)
+    print("size,config,solved,par10,solved_gain,par10_gain")
+    for k in range(size):
+        candidate_par10 = np.minimum(penalized, best_time).sum(axis=1) / n_instances
+        candidate_solved = np.count_nonzero(solved | best_solved, axis=1)
+        if criterion == "par10":
+            order = np.lexsort((-candidate_solved, candidate_par10))
+        else:
+            order = np.lexsort((candidate_par10, -candidate_solved))
+        j = order[~chosen[order]][0]
+        chosen[j] = True
+        np.minimum(best_time, penalized[j], out=best_time)
+        best_solved |= solved[j]
+        print("%d,%s,%d,%.2f,%d,%.2f" % (k + 1, configurations[j], candidate_solved[j], candidate_par10[j],
+                                         candidate_solved[j] - n_solved, par10 - candidate_par10[j]))
+        par10, n_solved = candidate_par10[j], candidate_solved[j]
+
+def easyMask(rundata, but=0, threshold=10):
+    """
+    Returns a boolean array over the instances, True for instances solved by
+    at least all but 'but' solvers in under 'threshold' seconds.
+    """
+    def compute():
+        solved_fast = np.count_nonzero(rundata.solved & (rundata.time <= threshold), axis=0)
+        return solved_fast + but >= len(rundata.configurations)
+    return rundata.memoized(("easy", but, threshold), compute)
 
 def getEasy(classes, configurations, instances, rundata, but=0, threshold=10):
     """
     Returns a list of instances that were solved by at least all but 'but' solvers in uder 'threshold' seconds.
     """
-    easy = []
-    for classname in classes:
-        for instance in instances[classname]:
-            if sum((ans != None and t <= threshold for (ans, t, *_) in (rundata[getUID(config, classname, instance)] for config in configurations))) + but >= len(configurations):
-                # create a regex pattern for grep filtering
-                #easy.append(instance + ",.*," + classname + ",")
-                easy.append(classname + "/" + instance)
-    return easy
+    labels = rundata.instanceLabels()
+    return [labels[i] for i in np.flatnonzero(easyMask(rundata, but, threshold)).tolist()]
 
-def bestTimeout(classes, configurations, instances, rundata, timeout):
+def solvedCurves(rundata, cutoffs):
     """
-    Assumes len(configurations) == 2.
-    Finds integers t_0, t_1 >= 1, such that the comparison of
-    the two configurations is most favourable for config_0 if
-    the time limit is t_0, and most favourable for config_1
-    if the time limit is t_1.
+    Returns solved[i, j] = the number of instances configuration i solved in less than cutoffs[j] seconds.
     """
+    solved = np.empty((len(rundata.configurations), len(cutoffs)), dtype=np.int64)
+    for i in range(len(rundata.configurations)):
+        solved[i] = np.searchsorted(rundata.solvedTimes(i), cutoffs, side="left")
+    return solved
+
+def relativeDifference(solved, rival):
+    return 100 * (solved - rival) / (rival + 1)
 
-    if len(configurations) != 2:
-        print("bestTimeout: Number of configurations must be 2, found %d" % len(configurations))
+def formatTime(t):
+    return "%d" % t if float(t).is_integer() else "%g" % t
+
+def bestTimeout(classes, configurations, instances, rundata, timeout, resolution=1, text=False, filename=None):
+    """
+    For every configuration i finds the time limit t_i (a multiple of 'resolution'
+    up to 'timeout') for which the comparison is most favourable for config_i,
+    measured as the relative difference in solved instances
+        100 * (solved_i - solved_rival) / (solved_rival + 1)
+    against the best other configuration at that time limit (the field),
+    and also against every other configuration on its own.
+
+    Prints the time limits t_i against the field and either plots the relative
+    differences against the field over all time limits (shown, or saved to 'filename'), or, if 'text' is set,
+    prints them together with the pairwise comparison as CSV.
+    """
+
+    if len(configurations) < 2:
+        print("bestTimeout: Number of configurations must be at least 2, found %d" % len(configurations))
         print(" ".join(configurations))
         sys.exit(1)
 
-    best_t = [0, 0]
-    solved_in_time = [[0 for j in range(timeout + 1)] for i in range(2)]
+    cutoffs = np.arange(int(round(timeout / resolution)) + 1) * resolution
+    solved = solvedCurves(rundata, cutoffs)
 
-    for classname in classes:
-        for instance in instances[classname]:
-            for i, config in enumerate(configurations):
-                ans, t, *_ = rundata[getUID(config, classname, instance)]
-                if ans != None:
-                    solved_in_time[i][int(t) + 1] += 1
-    
-    for i in range(2):
-        for j in range(1, timeout + 1):
-            solved_in_time[i][j] += solved_in_time[i][j-1]
+    # the best and second best number of solved instances at every time limit
+    leader = solved.argmax(axis=0)
+    top_two = np.sort(solved, axis=0)[-2:]
+    differences = np.empty(solved.shape)
+    for i in range(len(configurations)):
+        field = np.where(leader == i, top_two[0], top_two[1])
+        differences[i] = relativeDifference(solved[i], field)
+    best_t = differences.argmax(axis=1)
 
-    max_rel_diff = [-math.inf, -math.inf]
-    differences = [[0 for j in range(timeout + 1)] for i in range(2)]
-    
-    for j in range(timeout + 1):
-        d = solved_in_time[0][j] - solved_in_time[1][j]
-        for i in range(2):
-            differences[i][j] = 100 * ((-1) ** i) * d / (solved_in_time[1-i][j] + 1)
-            if differences[i][j] > max_rel_diff[i]:
-                max_rel_diff[i] = differences[i][j]
-                best_t[i] = j
-
-    print("%d %d" % tuple(best_t))
-    for i in range(2):
-        mp.plot(range(1, timeout+1), differences[i][1:], label=configurations[i])
-    mp.legend(loc=0, borderaxespad=0.5)
-    mp.axis([0, timeout + 1, min((min(differences[i]) for i in range(2))), max(max_rel_diff) + 1])
-    mp.show()
+    print(" ".join(formatTime(cutoffs[j]) for j in best_t))
+
+    if not text:
+        for i, config in enumerate(configurations):
+            mp.plot(cutoffs[1:], differences[i][1:], label=config)
+        mp.legend(loc=0, borderaxespad=0.5)
+        mp.axis([0, timeout + resolution, differences.min(), differences.max() + 1])
+        showOrSave(filename)
+        return
+
+    print("config,rival,best_timeout,relative_difference")
+    for i, config in enumerate(configurations):
+        print("%s,field,%s,%.2f" % (config, formatTime(cutoffs[best_t[i]]), differences[i, best_t[i]]))
+        pairwise = relativeDifference(solved[i], solved)
+        best_pairwise = pairwise.argmax(axis=1)
+        for k, rival in enumerate(configurations):
+            if k != i:
+                print("%s,%s,%s,%.2f" % (config, rival, formatTime(cutoffs[best_pairwise[k]]), pairwise[k, best_pairwise[k]]))
+    print()
+    print("timeout," + ",".join(configurations))
+    for t, row in zip(cutoffs.tolist(), differences.T.tolist()):
+        print(formatTime(t) + "," + ",".join("%.2f" % d for d in row))
+
+def writeMatrixRows(names, rows, chunk_size=65536):
+    """
+    Writes the CSV rows name,row to stdout in chunks of 'chunk_size' rows.
+    'rows' are the cells of every row already joined by commas.
+    """
+    for start in range(0, len(names), chunk_size):
+        sys.stdout.write("".join(name + "," + row + "\n" for name, row in zip(names[start:start + chunk_size], rows[start:start + chunk_size])))
+
+def exportMatrix(rundata, keep, kind, prefix, file_format):
+    """
+    Writes the solved ('kind' = "solved") or time matrix of the instances 'keep',
+    with a row per instance and a column per configuration, to files named 'prefix' with:
+
+        npy      prefix.npy, for solved the rows packed into bits (numpy.packbits, unpack with
+                 count = number of configurations), for time float32; and the labels of the rows
+                 and columns in prefix.instances.txt and prefix.configs.txt, one per line
+        arrow    prefix.arrow, an Arrow IPC (Feather) table with the column "instance" and
+                 a column per configuration
+        parquet  prefix.parquet, the same table in Parquet
+
+    The .npy files can be mapped with numpy.load(..., mmap_mode="r"). Arrow and Parquet need pyarrow.
+    Returns the names of the written files.
+    """
+    if kind == "solved":
+        matrix = rundata.solved[:, keep].T
+    else:
+        matrix = rundata.time[:, keep].T.astype(np.float32)
+    labels = rundata.instanceLabels()
+    row_labels = [labels[i] for i in keep.tolist()]
+
+    if file_format == "npy":
+        np.save(prefix + ".npy", np.packbits(matrix, axis=1) if kind == "solved" else matrix)
+        for name, lines in ((".instances.txt", row_labels), (".configs.txt", rundata.configurations)):
+            with open(prefix + name, "w") as f:
+                f.write("".join(line + "\n" for line in lines))
+        return [prefix + ".npy", prefix + ".instances.txt", prefix + ".configs.txt"]
+
+    try:
+        import pyarrow
+    except ImportError:
+        print("Error: --matrix-format %s needs the pyarrow package" % file_format)
+        sys.exit(2)
+    columns = [pyarrow.array(row_labels)] + [pyarrow.array(matrix[:, j]) for j in range(matrix.shape[1])]
+    table = pyarrow.table(columns, names=["instance"] + list(rundata.configurations))
+    if file_format == "arrow":
+        import pyarrow.feather
+        pyarrow.feather.write_feather(table, prefix + ".arrow")
+        return [prefix + ".arrow"]
+    import pyarrow.parquet
+    pyarrow.parquet.write_table(table, prefix + ".parquet")
+    return [prefix + ".parquet"]
+
+def solvedMatrix(classes, configurations, instances, rundata, prefix=None, file_format="csv"):
+    """
+    Prints the solved matrix of the instances that are not easy as CSV,
+    or exports it to files named 'prefix' in another format (see exportMatrix).
+    """
+    keep = np.flatnonzero(~easyMask(rundata))
+    if file_format != "csv":
+        exportMatrix(rundata, keep, "solved", prefix, file_format)
+        return
+    print("instance," + ",".join(configurations), flush=True)
+    # every row of cells as bytes: the digits separated by commas
+    cells = np.full((len(keep), 2 * len(configurations) - 1), ord(","), dtype=np.uint8)
+    cells[:, ::2] = rundata.solved[:, keep].T + ord("0")
+    rows = [row.decode() for row in cells.view("S%d" % cells.shape[1]).ravel().tolist()] if len(configurations) else [""] * len(keep)
+    writeMatrixRows([rundata.instance_names[i] for i in keep.tolist()], rows)
+
+def timeMatrix(classes, configurations, instances, rundata, prefix=None, file_format="csv"):
+    """
+    Prints the time matrix of the instances that are not easy as CSV,
+    or exports it to files named 'prefix' in another format (see exportMatrix).
+    """
+    keep = np.flatnonzero(~easyMask(rundata))
+    if file_format != "csv":
+        exportMatrix(rundata, keep, "time", prefix, file_format)
+        return
+    print("instance," + ",".join(configurations), flush=True)
+    rows = [",".join(map(str, row)) for row in rundata.time[:, keep].T.tolist()]
+    writeMatrixRows([rundata.instance_names[i] for i in keep.tolist()], rows)
 
-def solvedMatrix(classes, configurations, instances, rundata):
-    easy_set = set(getEasy(classes, configurations, instances, rundata))
-    print("instance," + ",".join(configurations))
-    for classname in classes:
-        for instance in instances[classname]:
-            if classname + "/" + instance not in easy_set:
-                print(instance + "," + ",".join("1" if rundata[getUID(config, classname, instance)][0] != None else "0" for config in configurations))
+def readCSV(filename):
+    """
+    Reads a results CSV as written by parseresults.py into columns.
+    Returns (columns, dictionaries), where columns maps "name", "class",
+    "config", "status" to integer arrays of ids into dictionaries[column],
+    "time" to the times and "result" to the answer codes (1, 0 or -1)
+    of the rows in the order of the file.
+    """
+    builder = ColumnBuilder()
+    with open(filename, "r") as f:
+        header = {col : idx for idx, col in enumerate(next(f).rstrip('\n').split(","))}
+        name_idx = header["Name"]
+        time_idx = header["Time"]
+        ans_idx = header["Result"]
+        status_idx = header["Status"]
+        class_idx = header["Class"]
+        config_idx = header["Configuration"]
 
-def timeMatrix(classes, configurations, instances, rundata):
-    easy_set = set(getEasy(classes, configurations, instances, rundata))
-    print("instance," + ",".join(configurations))
-    for classname in classes:
-        for instance in instances[classname]:
-            if classname + "/" + instance not in easy_set:
-                print(instance + "," + ",".join(str(rundata[getUID(config, classname, instance)][1]) for config in configurations))
+        add = builder.add
+        for line in f:
+            linedata = line.rstrip('\n').split(",")
+            add(linedata[name_idx], linedata[time_idx], linedata[ans_idx], linedata[status_idx], linedata[class_idx], linedata[config_idx])
 
+    columns = {column : np.frombuffer(values, dtype=column_types[column][1]) for column, values in builder.columns.items()}
+    return columns, builder.dictionaries()
 
+def loadColumns(filename):
+    """
+    Like readCSV, but uses the binary companion of the CSV (see binresults.py)
+    if it is newer than the CSV, and otherwise tries to write it for the next time.
+    """
+    binary = binaryName(filename)
+    st = os.stat(filename)
+    try:
+        if os.stat(binary).st_mtime_ns >= st.st_mtime_ns:
+            data = readBinary(binary, st.st_size)
+            if data is not None:
+                return data
+    except FileNotFoundError:
+        pass
 
-def getUID(config, classname, instance):
-    return config + ":" + classname + "/" + instance
+    columns, dictionaries = readCSV(filename)
+    try:
+        writeBinary(binary, columns, dictionaries, st.st_size)
+    except OSError as e:
+        print("Warning: could not write %s: %s" % (binary, e), file=sys.stderr)
+    return columns, dictionaries
 
-def init(filename, aggregate):
+def sortedIds(strings, ids):
+    """
+    Renumbers 'ids' (indices into 'strings') by the sorted order of 'strings'.
+    Returns the sorted strings and the new ids.
+    """
+    order = sorted(range(len(strings)), key=strings.__getitem__)
+    rank = np.empty(len(strings), dtype=np.int64)
+    rank[order] = np.arange(len(strings))
+    return [strings[i] for i in order], rank[ids]
+
+def buildRunData(columns, dictionaries, aggregate, describe_row=None):
+    """
+    Builds the RunData from the columns returned by readCSV.
+    'describe_row' turns a row index into a location for error messages.
+    """
+    names, name_ids = dictionaries["name"], columns["name"]
+    classnames, class_ids = dictionaries["class"], columns["class"]
+    if aggregate:
+        # every class/instance pair becomes an instance of the class '_ALL_'
+        pairs, pair_ids = np.unique(class_ids.astype(np.int64) * len(names) + name_ids, return_inverse=True)
+        pair_ids = pair_ids.reshape(-1)
+        names = [classnames[pair // len(names)] + "/" + names[pair % len(names)] for pair in pairs.tolist()]
+        name_ids = pair_ids
+        classnames = ["_ALL_"]
+        class_ids = np.zeros(len(name_ids), dtype=np.int64)
+
+    configurations, config_ids = sortedIds(dictionaries["config"], columns["config"])
+    classes, class_ids = sortedIds(classnames, class_ids)
+    names, name_ids = sortedIds(names, name_ids)
+
+    # instances are the distinct (class, name) pairs, numbered in sorted order
+    keys, instance_ids = np.unique(class_ids * len(names) + name_ids, return_inverse=True)
+    instance_ids = instance_ids.reshape(-1)
+    instance_class = keys // len(names)
+    instance_names = [names[key] for key in (keys % len(names)).tolist()]
+
+    n_configs, n_instances = len(configurations), len(keys)
+    flat = config_ids * n_instances + instance_ids
+    order = np.argsort(flat, kind="stable")
+    duplicates = order[1:][flat[order][1:] == flat[order][:-1]]
+    if len(duplicates) > 0:
+        row = int(duplicates.min())
+        i = int(instance_ids[row])
+        location = describe_row(row) if describe_row else "row %d" % (row + 1)
+        print("Error on %s: duplicate entry for config %s on instance %s of class %s" % (location, configurations[config_ids[row]], instance_names[i], classes[instance_class[i]]))
+        sys.exit(2)
+
+    answer = np.full((n_configs, n_instances), -1, dtype=np.int8)
+    time = np.zeros((n_configs, n_instances), dtype=np.float64)
+    status = np.full((n_configs, n_instances), -1, dtype=np.int8)
+    answer.flat[flat] = columns["result"]
+    # for logscale
+    time.flat[flat] = np.maximum(columns["time"], 0.001)
+    status.flat[flat] = columns["status"]
+
+    return RunData(configurations, classes, instance_names, instance_class, answer, time, status, dictionaries["status"])
+
+def guessTimeout(columns, dictionaries):
+    """
+    Guesses the timeout used as int(min(time)) over timed-out runs.
+    If no run timed out, the timeout is set to int(max(time)) + 1.
+    Runs without a time (still running) are ignored.
+    """
+    has_time = ~np.isnan(columns["time"])
+    if "time" in dictionaries["status"]:
+        timed_out = (columns["status"] == dictionaries["status"].index("time")) & has_time
+        if timed_out.any():
+            return int(columns["time"][timed_out].min())
+    return int(columns["time"][has_time].max(initial=0)) + 1
+
+def mergeColumns(loaded):
+    """
+    Merges the (columns, dictionaries) of several files into one, renumbering
+    the ids into the merged dictionaries. Also adds the column "file" with the
+    index of the file every row comes from, and "row" with its row in that file.
+    """
+    if len(loaded) == 1:
+        columns, dictionaries = loaded[0]
+        rows = len(columns["time"])
+        return dict(columns, file=np.zeros(rows, dtype=np.int32), row=np.arange(rows)), dictionaries
+
+    merged_ids = {column : {} for column in loaded[0][1]}
+    parts = {column : [] for column in loaded[0][0]}
+    parts["file"] = []
+    parts["row"] = []
+    for k, (columns, dictionaries) in enumerate(loaded):
+        for column, values in columns.items():
+            if column in dictionaries:
+                ids = merged_ids[column]
+                renumber = np.array([ids.setdefault(string, len(ids)) for string in dictionaries[column]], dtype=np.int32)
+                values = renumber[values] if len(renumber) else values
+            parts[column].append(values)
+        rows = len(columns["time"])
+        parts["file"].append(np.full(rows, k, dtype=np.int32))
+        parts["row"].append(np.arange(rows))
+    columns = {column : np.concatenate(values) for column, values in parts.items()}
+    return columns, {column : list(ids) for column, ids in merged_ids.items()}
+
+def expandFilenames(patterns):
+    """
+    Expands glob patterns among the given filenames, keeping the order of the arguments.
+    The binary companions that loadColumns writes next to the CSV files are not matched.
+    """
+    filenames = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
+            companions = {binaryName(match) for match in matches}
+            matches = [match for match in matches if match not in companions]
+        else:
+            matches = [pattern]
+        if not matches:
+            print("Error: no file matches '%s'" % pattern)
+            sys.exit(2)
+        filenames += matches
+    return filenames
+
+def loadColumnsTimed(filename):
+    start = time.perf_counter()
+    data = loadColumns(filename)
+    return data, time.perf_counter() - start
+
+def init(filenames, aggregate, jobs=1, profile=None):
     """
     This function parses the data and creates the following data structures:
 
@@ -223,76 +794,43 @@ def init(filename, aggregate):
         # for every class a list of its instances
         instances = dict(class:string, list(instance:string))
 
-        # for every instance and configuration identified as a tuple ('class/instance', 'config') the rundata
-        rundata = dict{class/instance:string, config:string}{answer:enum(True, False, None), time:float)}
+        # the answers, times and statuses of all runs as arrays over configurations x instances
+        rundata = RunData
+
+    'filenames' is a CSV file or a list of them (or glob patterns), which are loaded
+    by up to 'jobs' processes and merged. Every run may occur in only one of them.
+    If 'profile' is given, the time spent loading every file is recorded in it.
 
     It also guesses the timeout used as int(min(time)) over timed-out instances.
     If all instances are solved, the timeout is set to int(max(time)) + 1.
     """
-    header = None
-    name_idx = -1
-    time_idx = -1
-    ans_idx = -1
-    ans_dict = {"10" : True, "20" : False}
-    status_idx = -1
-    class_idx = -1
-    config_idx = -1
-
-    classes = set()
-    configurations = set()
-    instances = defaultdict(set)
-    rundata = {}
-    timeout = math.inf
+    if isinstance(filenames, str):
+        filenames = [filenames]
+    filenames = expandFilenames(filenames)
 
-    with open(filename, "r") as f:
-        header = {col : idx for idx, col in enumerate(next(f).rstrip('\n').split(","))}
-        name_idx = header["Name"]
-        time_idx = header["Time"]
-        ans_idx = header["Result"]
-        status_idx = header["Status"]
-        class_idx = header["Class"]
-        configuration_idx = header["Configuration"]
+    phase = profile.phase if profile else lambda name: nullcontext()
 
-        line_number = 1
-        for line in f:
-            line_number += 1
-            linedata = line.rstrip('\n').split(",")
-            instance = linedata[name_idx]
-            time = float(linedata[time_idx])
-            answer = ans_dict.get(linedata[ans_idx])
-            status = linedata[status_idx]
-            classname = linedata[class_idx]
-            config = linedata[config_idx]
-            
-            if aggregate:
-                instance = classname + "/" + instance
-                classname = "_ALL_"
-
-            classes.add(classname)
-            configurations.add(config)
-
-            if status == "time" and time < timeout:
-                timeout = time
-            
-            # for logscale
-            time = max(time, 0.001)
-
-            # do not adjust time for unsolved instances
-            # time can still be useful
-            #if answer == None or status != "ok":
-            #    time = timeout
-            instances[classname].add(instance)
-            uid = getUID(config, classname, instance)
-            if uid in rundata:
-                print("Error on line %d: duplicate entry for config %s on instance %s of class %s" % (line_number, config, instance, classname))
-                sys.exit(2)
-            rundata[uid] = (answer, time, status)
-    
-    timeout = int(timeout)
-    classes = sorted(classes)
-    configurations = sorted(configurations)
+    with phase("load"):
+        if jobs > 1 and len(filenames) > 1:
+            with multiprocessing.Pool(min(jobs, len(filenames))) as p:
+                loaded = p.map(loadColumnsTimed, filenames, 1)
+        else:
+            loaded = [loadColumnsTimed(filename) for filename in filenames]
+    if profile:
+        for filename, (data, seconds) in zip(filenames, loaded):
+            profile.addFile(seconds, filename, {"csv": os.path.getsize(filename)})
+
+    with phase("merge"):
+        columns, dictionaries = mergeColumns([data for data, seconds in loaded])
 
-    return classes, configurations, instances, rundata, timeout
+    describe_row = lambda row: "line %d of %s" % (columns["row"][row] + 2, filenames[columns["file"][row]])
+    with phase("build"):
+        rundata = buildRunData(columns, dictionaries, aggregate, describe_row)
+        timeout = guessTimeout(columns, dictionaries)
+
+    instances = {classname : rundata.instance_names[rundata.class_start[k]:rundata.class_start[k+1]] for k, classname in enumerate(rundata.classes)}
+
+    return rundata.classes, rundata.configurations, instances, rundata, timeout
 
 def verify(classes, configurations, instances, rundata):
     """
@@ -304,97 +842,329 @@ def verify(classes, configurations, instances, rundata):
     
     success = True
 
-    for classname in classes:
-        for instance in instances[classname]:
-            votes = [[],[]]
-            for config in configurations:
-                ans = rundata[getUID(config, classname, instance)][0]
-                if ans != None:
-                    votes[ans].append(config)
-            if len(votes[False]) * len(votes[True]) > 0:
-                success = False
-                print("Disagreement on instance '%s' of class '%s'" % (instance, classname))
-                print("The following solvers/configs say False: " + ", ".join(votes[False]))
-                print("The following solvers/configs say True:  " + ", ".join(votes[True]))
+    says_false = rundata.answer == 0
+    says_true = rundata.answer == 1
+    for i in np.flatnonzero(says_false.any(axis=0) & says_true.any(axis=0)).tolist():
+        success = False
+        print("Disagreement on instance '%s' of class '%s'" % (rundata.instance_names[i], classes[rundata.instance_class[i]]))
+        print("The following solvers/configs say False: " + ", ".join(configurations[j] for j in np.flatnonzero(says_false[:, i]).tolist()))
+        print("The following solvers/configs say True:  " + ", ".join(configurations[j] for j in np.flatnonzero(says_true[:, i]).tolist()))
 
     if len(rundata) != len(configurations) * sum((len(instances[classname]) for classname in classes)):
         success = False
         print("Error: the number of run-data entries should be number of instances times the number of configurations.")
     return success
 
+def solvedBits(rundata):
+    """
+    Returns the solved matrix packed into one bitset per configuration,
+    as uint8[config, ceil(instances / 8)]: bit i of row j is set if config j solved instance i.
+    """
+    return rundata.memoized("solved bits", lambda: np.packbits(rundata.solved, axis=1))
+
+def bitsetInstances(bitset, n_instances):
+    return np.flatnonzero(np.unpackbits(bitset, count=n_instances))
+
+def solvedByNone(bits, n_instances):
+    """
+    Returns the ids of the instances not solved by any configuration.
+    """
+    return bitsetInstances(~np.bitwise_or.reduce(bits, axis=0), n_instances)
+
+def solvedUniquely(bits, n_instances):
+    """
+    Returns for every configuration the ids of the instances solved by it and by no other configuration.
+    """
+    # solved_up_to[j] and solved_from[j] are the unions of the bitsets of the configs <= j and >= j
+    solved_up_to = np.bitwise_or.accumulate(bits, axis=0)
+    solved_from = np.bitwise_or.accumulate(bits[::-1], axis=0)[::-1]
+    unique = []
+    for j in range(len(bits)):
+        others = np.zeros(bits.shape[1], dtype=np.uint8)
+        if j > 0:
+            others |= solved_up_to[j-1]
+        if j + 1 < len(bits):
+            others |= solved_from[j+1]
+        unique.append(bitsetInstances(bits[j] & ~others, n_instances))
+    return unique
+
+def solvedSubsets(rundata):
+    """
+    Counts for every set of configurations the instances solved by exactly the configurations in the set.
+    Only sets that occur are counted. Returns a list of (set as a tuple of config ids, count),
+    ordered by the number whose i-th bit says whether config i is in the set.
+    """
+    n_configs = len(rundata.configurations)
+    # the set of configs that solved an instance, packed into bytes
+    signatures = np.packbits(rundata.solved.T, axis=1)
+    if n_configs == 0:
+        return [((), rundata.solved.shape[1])]
+    unique, counts = np.unique(signatures, axis=0, return_counts=True)
+    members = np.unpackbits(unique, axis=1, count=n_configs).astype(bool)
+    subsets = [(tuple(np.flatnonzero(m).tolist()), count) for m, count in zip(members, counts.tolist())]
+    subsets.sort(key=lambda subset: sorted(subset[0], reverse=True))
+    return subsets
+
 def venn(classes, configurations, instances, rundata):
     """
     This function calculates the values in a Venn diagram of
-    solved instances by configurations
-    """
-    values = [0] * 2 ** len(configurations)
-    for classname in classes:
-        for instance in instances[classname]:
-            subset_idx = 0
-            for i, config in enumerate(configurations):
-                ans = rundata[getUID(config, classname, instance)][0]
-                if ans != None:
-                    subset_idx += 2 ** i
-            values[subset_idx] += 1
-    for idx, val in enumerate(values):
-        i = 0
-        while idx > 0:
-            if idx % 2 == 1:
-                print(configurations[i] + " ", end="")
-            idx //= 2
-            i += 1
-        print(val)
+    solved instances by configurations.
+    Only the regions of the diagram that contain instances are printed.
+    """
+    for subset, count in solvedSubsets(rundata):
+        for i in subset:
+            print(configurations[i] + " ", end="")
+        print(count)
+
+def printUnique(classes, configurations, instances, rundata):
+    """
+    Prints the instances solved by exactly one configuration, preceded by that configuration.
+    """
+    labels = rundata.instanceLabels()
+    for config, unique in zip(configurations, solvedUniquely(solvedBits(rundata), len(labels))):
+        for i in unique.tolist():
+            print(config + " " + labels[i])
+
+def printUnsolved(classes, configurations, instances, rundata):
+    labels = rundata.instanceLabels()
+    for i in solvedByNone(solvedBits(rundata), len(labels)).tolist():
+        print(labels[i])
 
     
-if __name__ == "__main__":
+analyses = ("stats", "matrix_solved", "matrix_time", "families", "outliers", "venn", "unique", "unsolved", "easy", "bootstrap", "portfolio", "cactus", "scatter", "best_timeout")
+
+def positiveInt(text):
+    value = int(text)
+    if value < 1:
+        raise ArgumentTypeError("expected a positive number, got %s" % text)
+    return value
+
+def positiveFloat(text):
+    value = float(text)
+    if not value > 0:
+        raise ArgumentTypeError("expected a positive number, got %s" % text)
+    return value
+
+def fraction(text):
+    value = float(text)
+    if not 0 < value < 1:
+        raise ArgumentTypeError("expected a number between 0 and 1, got %s" % text)
+    return value
+
+def makeParser():
     parser = ArgumentParser()
-    parser.add_argument("filename", nargs='?', help="The csv file with the results as parsed by parseresults.py.")
-    parser.add_argument("-b", "--best-timeout", action="store_true", default=False, help="Search for the optimal time limit to differentiate between 2 configs.")
+    parser.add_argument("filenames", nargs='*', help="The csv files with the results as parsed by parseresults.py, or glob patterns for them. The default is results_merged.csv.")
+    parser.add_argument("-b", "--best-timeout", action="store_true", default=False, help="Search for the time limit most favourable for each configuration compared to the others.")
     parser.add_argument("-c", "--cactus", action="store_true", default=False, help="Make a cactus plot of the various configurations and classes.")
     parser.add_argument("-e", "--easy", type=int, default=0, help="Identify instances solved by all solvers within the given time limit.")
     parser.add_argument("-g", "--aggregate", action="store_true", default=False, help="Treat all classes as one.")
     parser.add_argument("-f", "--families", action="store_true", default=False, help="Find families with large differences between solvers.")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of processes that load the csv files. 0 means one per CPU. The default is 1.")
     parser.add_argument("-m", "--matrix-solved", action="store_true", default=False, help="Print a CSV-style binary matrix where a_{ij} = 1 if solver j solved instance i, and 0 otherwise.")
     parser.add_argument("-M", "--matrix-time", action="store_true", default=False, help="Print a CSV-style binary matrix where t_{ij} = time solver j took on instance i.")
+    parser.add_argument("--matrix-format", choices=["csv", "npy", "arrow", "parquet"], default="csv", help="Write the matrices of -m and -M to files named after the analysis (in --output-dir) instead of printing them as CSV: npy writes the solved matrix packed into bits and the time matrix as float32, with the instance and configuration labels in .instances.txt and .configs.txt files; arrow and parquet write a table with a column per configuration (needs pyarrow). The default is csv.")
     parser.add_argument("-o", "--outliers", action="store_true", default=False, help="Find instances with large differences between solvers.")
     parser.add_argument("-s", "--stats", action="store_true", default=False, help="Display statistics about the results.")
     parser.add_argument("-t", "--timeout", type=int, default=0, help="Specify the cutoff time that was used for these runs.")
+    parser.add_argument("-u", "--unique", action="store_true", default=False, help="List the instances solved by only one configuration.")
+    parser.add_argument("-U", "--unsolved", action="store_true", default=False, help="List the instances solved by no configuration.")
     parser.add_argument("-v", "--venn", action="store_true", default=False, help="Compute the Venn diagram of solved instances for the configurations.")
+    parser.add_argument("-r", "--resolution", type=positiveFloat, default=1, help="Granularity in seconds of the time limits tried by --best-timeout. The default is 1.")
+    parser.add_argument("-T", "--text", action="store_true", default=False, help="Print the results of --best-timeout as CSV instead of plotting them.")
     parser.add_argument("-x", "--scatter", action="store_true", default=False, help="Make a scatter plot that compares 2 configurations.")
-    args = parser.parse_args()
+    parser.add_argument("-F", "--format", choices=["png", "pdf", "svg"], default=None, help="Save the plots in this format to files named after the analysis (in --output-dir) instead of showing them. Needs no display.")
+    parser.add_argument("--split", choices=["class", "config"], default=None, help="Make a separate cactus plot for every class or every configuration. Saved plots are rendered by --jobs processes.")
+    parser.add_argument("--hexbin", type=int, default=10000, metavar="N", help="Draw scatter plots of more than N instances as a density of hexagonal bins. The default is 10000.")
+    parser.add_argument("--usetex", action="store_true", default=False, help="Typeset the labels of scatter plots with LaTeX.")
+    parser.add_argument("-k", "--top", type=positiveInt, default=None, metavar="K", help="Print only the K instances or families with the largest differences for --outliers and --families.")
+    parser.add_argument("--metric", choices=["stddev", "relvar", "logspread"], default=None, help="Measure of the differences for --outliers (runtimes, default stddev) and --families (solved instances, default relvar). logspread is the standard deviation of the log10 runtimes, which compares better across timeouts.")
+    parser.add_argument("-P", "--portfolio", type=positiveInt, nargs="?", const=-1, default=0, metavar="K", help="Compute the virtual best solver and greedily choose a portfolio of K configurations (default all of them) to run in parallel.")
+    parser.add_argument("--portfolio-by", choices=["par10", "solved"], default="par10", help="What the portfolio is chosen by. The default is par10.")
+    parser.add_argument("-B", "--bootstrap", type=positiveInt, nargs="?", const=10000, default=0, metavar="N", help="Estimate confidence intervals of the solved instances and PAR10, and win probabilities between the configurations, from N resamples of the instances (default 10000).")
+    parser.add_argument("--confidence", type=fraction, default=0.95, help="Confidence level of the intervals of --bootstrap. The default is 0.95.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the random resampling of --bootstrap, to make it reproducible.")
+    parser.add_argument("-R", "--report", type=str, default=None, metavar="SPEC", help="Run the analyses listed in the file SPEC, one set of options like '-e 100' per line, optionally followed by '> file'. Implies --output-dir.")
+    parser.add_argument("-O", "--output-dir", type=str, default=None, metavar="DIR", help="Run all given analyses and write the output of each to its own file in DIR. This is the default, with the current directory, when several analyses are given.")
+    parser.add_argument("--serve", nargs="?", const=default_address, default=None, metavar="ADDRESS", help="Load the data once and answer the text analyses of clients until interrupted. ADDRESS is a Unix socket path or [host:]port; the default is %s." % default_address)
+    parser.add_argument("--server", type=str, default=None, metavar="ADDRESS", help="Ask the daemon started with --serve at ADDRESS instead of loading the data. By default the daemon at $%s or %s is asked if it is running." % (server_variable, default_address))
+    parser.add_argument("-p", "--profile", type=int, nargs="?", const=10, default=None, metavar="N", help="Print the time spent in every phase and the N slowest files to load (default 10) as JSON to stderr.")
+    return parser
+
+def selectedAnalyses(args):
+    return [name for name in analyses if getattr(args, name)]
+
+# the output files of the batch mode are named after the analysis with this extension
+output_extensions = {"matrix_solved": ".csv", "matrix_time": ".csv"}
+
+def plots(analysis, args):
+    return analysis in ("cactus", "scatter") or (analysis == "best_timeout" and not args.text)
+
+def exports(analysis, args):
+    return analysis in ("matrix_solved", "matrix_time") and args.matrix_format != "csv"
+
+def runAnalysis(analysis, args, classes, configurations, instances, rundata, timeout, output_file=None, jobs=1):
+    """
+    Runs the analysis 'analysis' (one of analyses) with the options in the command line arguments 'args'.
+    Plots are saved to 'output_file' if given, and shown otherwise.
+    Matrices in a binary format are written to files named 'output_file' (see exportMatrix).
+    Returns the names of the plots saved, if they differ from 'output_file'.
+    """
+    if analysis == "stats":
+        printStats(classes, configurations, instances, rundata, timeout)
+    elif analysis == "matrix_solved":
+        solvedMatrix(classes, configurations, instances, rundata, output_file, args.matrix_format)
+    elif analysis == "matrix_time":
+        timeMatrix(classes, configurations, instances, rundata, output_file, args.matrix_format)
+    elif analysis == "families":
+        analyzeFamilies(classes, configurations, instances, rundata, args.top, args.metric or "relvar")
+    elif analysis == "outliers":
+        findOutliers(classes, configurations, instances, rundata, args.top, args.metric or "stddev")
+    elif analysis == "venn":
+        venn(classes, configurations, instances, rundata)
+    elif analysis == "unique":
+        printUnique(classes, configurations, instances, rundata)
+    elif analysis == "unsolved":
+        printUnsolved(classes, configurations, instances, rundata)
+    elif analysis == "easy":
+        easy_instances = getEasy(classes, configurations, instances, rundata, threshold=args.easy)
+        print("\n".join(easy_instances))
+    elif analysis == "portfolio":
+        portfolio(classes, configurations, instances, rundata, timeout, args.portfolio, args.portfolio_by)
+    elif analysis == "bootstrap":
+        bootstrap(classes, configurations, instances, rundata, timeout, args.bootstrap, args.confidence, args.seed)
+    else:
+        if plots(analysis, args):
+            importPyplot(headless=output_file is not None)
+        if analysis == "cactus":
+            written = cactusPlot(classes, configurations, instances, rundata, timeout, output_file, args.split, jobs)
+            if written != [output_file]:
+                return written
+        elif analysis == "scatter":
+            scatterPlot(classes, configurations, instances, rundata, timeout, output_file, args.usetex, args.hexbin)
+        elif analysis == "best_timeout":
+            bestTimeout(classes, configurations, instances, rundata, timeout, args.resolution, args.text, output_file)
+
+def readReport(filename):
+    """
+    Reads a report spec. Every line holds the options of analyses as on the command line,
+    e.g. "-s -v", "-e 100" or "--best-timeout --text -r 5", optionally followed by "> file"
+    to name the output file. Empty lines and comments starting with # are skipped.
+    Returns a list of (analysis, options, output file or None).
+    """
+    parser = makeParser()
+    report = []
+    with open(filename) as f:
+        for n, line in enumerate(f, 1):
+            tokens = shlex.split(line, comments=True)
+            if not tokens:
+                continue
+            output = None
+            if ">" in tokens:
+                k = tokens.index(">")
+                if k != len(tokens) - 2:
+                    print("Error on line %d of %s: expected one file name after '>'" % (n, filename))
+                    sys.exit(2)
+                tokens, output = tokens[:k], tokens[k+1]
+            options = parser.parse_args(tokens)
+            selected = selectedAnalyses(options)
+            if options.filenames or not selected:
+                print("Error on line %d of %s: expected the options of an analysis" % (n, filename))
+                sys.exit(2)
+            if output is not None and len(selected) > 1:
+                print("Error on line %d of %s: one output file given for several analyses" % (n, filename))
+                sys.exit(2)
+            report += [(analysis, options, output) for analysis in selected]
+    return report
+
+def outputName(analysis, options, output, occurrences):
+    """
+    Returns the name of the output file of the analysis, or None for a plot that is shown.
+    Unless given as 'output', the file is named after the analysis, numbered if the analysis
+    occurs more than once (counted in 'occurrences'). Plots are saved in the format of --format,
+    and the name of a matrix exported in a binary format is the start of the names of its files.
+    """
+    if output is not None:
+        return output
+    if plots(analysis, options) and options.format is None:
+        return None
+    occurrences[analysis] = occurrences.get(analysis, 0) + 1
+    number = "" if occurrences[analysis] == 1 else "-%d" % occurrences[analysis]
+    if plots(analysis, options):
+        return analysis + number + "." + options.format
+    if exports(analysis, options):
+        return analysis + number
+    return analysis + number + output_extensions.get(analysis, ".txt")
+
+def runBatch(report, output_dir, classes, configurations, instances, rundata, timeout, profile=None, jobs=1):
+    """
+    Runs the analyses of 'report' (see readReport) on the loaded data, writing the output
+    of every analysis into its own file in 'output_dir' (see outputName).
+    Plots and binary matrices are saved to their files, and what they print goes to stdout.
+    """
+    phase = profile.phase if profile else lambda name: nullcontext()
+    os.makedirs(output_dir, exist_ok=True)
+    occurrences = {}
+    for analysis, options, output in report:
+        output = outputName(analysis, options, output, occurrences)
+        if output is None:
+            with phase(analysis):
+                runAnalysis(analysis, options, classes, configurations, instances, rundata, timeout, jobs=jobs)
+            continue
+        path = os.path.join(output_dir, output)
+        written = None
+        if plots(analysis, options) or exports(analysis, options):
+            with phase(analysis):
+                written = runAnalysis(analysis, options, classes, configurations, instances, rundata, timeout, path, jobs)
+        else:
+            with phase(analysis), open(path, "w") as f, redirect_stdout(f):
+                runAnalysis(analysis, options, classes, configurations, instances, rundata, timeout, jobs=jobs)
+        print("%s: %s" % (analysis, ", ".join(written or [path])))
+
+if __name__ == "__main__":
+    args = makeParser().parse_args()
+
+    profile = None if args.profile is None else Profile(args.profile)
+    phase = profile.phase if profile else lambda name, inner=(): nullcontext()
     
-    if args.filename == None:
-        args.filename = "results_merged.csv"
+    if not args.filenames:
+        args.filenames = ["results_merged.csv"]
+
+    report = [(analysis, args, None) for analysis in selectedAnalyses(args)]
+    batch = args.report is not None or args.output_dir is not None or len(report) > 1 or args.format is not None or args.matrix_format != "csv"
+    if args.report is not None:
+        report += readReport(args.report)
+
+    if args.serve is not None:
+        serve(args.serve, args.filenames, args.aggregate, args.jobs if args.jobs > 0 else multiprocessing.cpu_count())
+        sys.exit(0)
+    if args.profile is None and not batch and servable(args):
+        response = query(args.server or os.environ.get(server_variable) or default_address, sys.argv[1:],
+                         required=args.server is not None)
+        if response is not None:
+            sys.stdout.write(response["output"])
+            sys.exit(response["status"])
         
-    classes, configurations, instances, rundata, timeout = init(args.filename, args.aggregate)
+    if args.jobs <= 0:
+        args.jobs = multiprocessing.cpu_count()
+
+    with phase("init", inner=["load", "merge", "build"]):
+        classes, configurations, instances, rundata, timeout = init(args.filenames, args.aggregate, args.jobs, profile)
     if args.timeout > 0:
         timeout = args.timeout
     else:
         print("Guessed timeout: %d" % timeout)
-    if verify(classes, configurations, instances, rundata):
+    with phase("verify"):
+        agree = verify(classes, configurations, instances, rundata)
+    if agree:
         print("Solvers agree ✓")
-    
-    if args.stats:
-        printStats(classes, configurations, instances, rundata, timeout)
-    elif args.matrix_solved:
-        solvedMatrix(classes, configurations, instances, rundata)
-    elif args.matrix_time:
-        timeMatrix(classes, configurations, instances, rundata)
-    elif args.families:
-        analyzeFamilies(classes, configurations, instances, rundata)
-    elif args.outliers:
-        findOutliers(classes, configurations, instances, rundata)
-    elif args.venn:
-        venn(classes, configurations, instances, rundata)
-    elif args.easy > 0:
-        easy_instances = getEasy(classes, configurations, instances, rundata, threshold=args.easy)
-        print("\n".join(easy_instances))
-    else:
-        import matplotlib.pyplot as mp
-        if args.cactus:
-            cactusPlot(classes, configurations, instances, rundata, timeout)
-        elif args.scatter:
-            scatterPlot(classes, configurations, instances, rundata, timeout)
-        elif args.best_timeout:
-            bestTimeout(classes, configurations, instances, rundata, timeout)
+
+    if batch:
+        runBatch(report, args.output_dir or ".", classes, configurations, instances, rundata, timeout, profile, args.jobs)
+    elif report:
+        analysis = report[0][0]
+        with phase(analysis):
+            runAnalysis(analysis, args, classes, configurations, instances, rundata, timeout, jobs=args.jobs)
+
+    if profile:
+        profile.report()
 
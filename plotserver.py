@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Query daemon for plotresults.py.
+
+'plotresults.py --serve' loads the run data once and keeps it in memory, and
+plotresults.py calls with the same flags are then answered by the daemon instead
+of loading the CSV files again. The data is reloaded when one of the files changes.
+
+The daemon listens on a Unix socket, or on a TCP port of localhost. Every connection
+carries one request, a line of JSON
+
+    {"argv": [command line arguments of plotresults.py], "cwd": working directory of the client}
+
+answered by one line of JSON
+
+    {"output": what plotresults.py would print, "status": its exit status}
+
+Only the analyses that print text are answered, plots are still made by the client.
+"""
+
+import os, sys
+import io
+import json
+import signal
+import socket
+import traceback
+import socketserver
+from contextlib import redirect_stdout
+
+default_address = ".plotresults.sock"
+server_variable = "PLOTRESULTS_SERVER"
+
+def servable(args):
+    """
+    Tells whether the daemon can answer the request given by the command line arguments 'args'.
+    """
+    if args.cactus or args.scatter or (args.best_timeout and not args.text):
+        return False
+    return True
+
+def parseAddress(address):
+    """
+    Returns (socket family, address) for "port", "host:port" or the path of a Unix socket.
+    """
+    host, _, port = address.rpartition(":")
+    if port.isdigit() and "/" not in address:
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+    return socket.AF_UNIX, address
+
+def listening(family, address):
+    with socket.socket(family, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(address)
+        except (ConnectionRefusedError, FileNotFoundError):
+            return False
+    return True
+
+def fileSignature(filenames):
+    signature = []
+    for filename in filenames:
+        st = os.stat(filename)
+        signature.append((filename, st.st_size, st.st_mtime_ns))
+    return signature
+
+class ResultsServer:
+    """
+    Keeps the loaded data of every set of files it has been asked about,
+    together with the output of verify, which does not depend on the request.
+    """
+
+    def __init__(self, jobs=1):
+        self.jobs = jobs
+        self.datasets = {}
+
+    def load(self, filenames, aggregate):
+        """
+        Returns the data loaded by init for the files, loading them
+        only if they were not loaded before or have changed since.
+        """
+        import plotresults
+
+        filenames = [os.path.abspath(filename) for filename in plotresults.expandFilenames(filenames)]
+        key = (tuple(filenames), aggregate)
+        signature = fileSignature(filenames)
+        if key in self.datasets and self.datasets[key][0] == signature:
+            return self.datasets[key][1]
+
+        data = plotresults.init(filenames, aggregate, self.jobs)
+        with redirect_stdout(io.StringIO()) as verify_output:
+            if plotresults.verify(*data[:4]):
+                print("Solvers agree ✓")
+        self.datasets[key] = (signature, (data, verify_output.getvalue()))
+        print("Loaded %s%s" % (", ".join(filenames), " (aggregated)" if aggregate else ""), file=sys.stderr)
+        return self.datasets[key][1]
+
+    def answer(self, argv, cwd):
+        """
+        Runs plotresults.py with the arguments 'argv' in the directory 'cwd'.
+        Returns what it prints and its exit status.
+        """
+        import plotresults
+
+        output = io.StringIO()
+        status = 0
+        with redirect_stdout(output):
+            try:
+                args = plotresults.makeParser().parse_args(argv)
+                if not servable(args):
+                    raise ValueError("the daemon answers only the analyses that print text")
+                filenames = [os.path.join(cwd, filename) for filename in args.filenames or ["results_merged.csv"]]
+                (classes, configurations, instances, rundata, timeout), verify_output = self.load(filenames, args.aggregate)
+                if args.timeout > 0:
+                    timeout = args.timeout
+                else:
+                    print("Guessed timeout: %d" % timeout)
+                output.write(verify_output)
+                for analysis in plotresults.selectedAnalyses(args)[:1]:
+                    plotresults.runAnalysis(analysis, args, classes, configurations, instances, rundata, timeout)
+            except SystemExit as e:
+                status = e.code if isinstance(e.code, int) else 2
+            except OSError as e:
+                print("Error: %s" % e)
+                status = 2
+            except Exception:
+                traceback.print_exc(file=output)
+                status = 1
+        return output.getvalue(), status
+
+class RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            # a connection that only checks whether the daemon is listening
+            return
+        request = json.loads(line)
+        output, status = self.server.results.answer(request["argv"], request["cwd"])
+        self.wfile.write((json.dumps({"output": output, "status": status}) + "\n").encode())
+
+class UnixServer(socketserver.UnixStreamServer):
+    pass
+
+class TCPServer(socketserver.TCPServer):
+    allow_reuse_address = True
+
+def serve(address, filenames, aggregate=False, jobs=1):
+    """
+    Loads the files and answers requests at 'address' (see parseAddress)
+    one after another until interrupted.
+    """
+    family, address = parseAddress(address)
+    if family == socket.AF_UNIX and os.path.exists(address):
+        if listening(family, address):
+            print("Error: a daemon is already listening at %s" % address)
+            sys.exit(2)
+        # left behind by a daemon that did not shut down
+        os.unlink(address)
+
+    server = (UnixServer if family == socket.AF_UNIX else TCPServer)(address, RequestHandler)
+    server.results = ResultsServer(jobs)
+    server.results.load(filenames, aggregate)
+    print("Listening at %s" % (address if family == socket.AF_UNIX else "%s:%d" % address), file=sys.stderr)
+    # remove the socket also when terminated
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if family == socket.AF_UNIX:
+            os.unlink(address)
+
+def query(address, argv, cwd=None, required=False):
+    """
+    Sends the arguments 'argv' to the daemon at 'address' and returns its response,
+    or None if no daemon is listening there, unless 'required' is set, in which case this is an error.
+    """
+    family, address = parseAddress(address)
+    if family == socket.AF_UNIX and not required and not os.path.exists(address):
+        return None
+    try:
+        with socket.socket(family, socket.SOCK_STREAM) as s:
+            s.connect(address)
+            s.sendall((json.dumps({"argv": argv, "cwd": cwd or os.getcwd()}) + "\n").encode())
+            with s.makefile("rb") as f:
+                return json.loads(f.readline())
+    except (ConnectionRefusedError, FileNotFoundError):
+        if required:
+            print("Error: no daemon is listening at %s" % (address,))
+            sys.exit(2)
+        return None
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Phase timing for the --profile option of parseresults.py and plotresults.py.
+"""
+
+import sys
+import json
+import time
+import heapq
+from contextlib import contextmanager
+
+class Profile:
+    """
+    Collects the wall time and count of named phases, and the slowest files.
+
+    Phases can be nested in the pipeline (the CSV writer pulls rows from the sort,
+    which pulls them from the parser). A phase given 'inner' phases reports its
+    time without the time those phases accumulated in the meantime.
+    """
+
+    def __init__(self, slowest=10):
+        self.phases = {}
+        self.slowest = slowest
+        self.files = []
+
+    def add(self, name, seconds, count=1, size=None):
+        phase = self.phases.setdefault(name, {"seconds": 0.0, "count": 0})
+        phase["seconds"] += seconds
+        phase["count"] += count
+        if size is not None:
+            phase["bytes"] = phase.get("bytes", 0) + size
+
+    def seconds(self, names):
+        return sum(self.phases[name]["seconds"] for name in names if name in self.phases)
+
+    @contextmanager
+    def phase(self, name, inner=(), count=1):
+        start, inner_start = time.perf_counter(), self.seconds(inner)
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start - (self.seconds(inner) - inner_start), count)
+
+    def iterate(self, name, iterable, inner=()):
+        """
+        Yields from 'iterable', adding the time spent waiting for its items to the phase 'name'.
+        """
+        iterator = iter(iterable)
+        while True:
+            start, inner_start = time.perf_counter(), self.seconds(inner)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.add(name, time.perf_counter() - start - (self.seconds(inner) - inner_start), 0)
+            self.phases[name]["count"] += 1
+            yield item
+
+    def addFile(self, seconds, path, sizes):
+        entry = (seconds, path, sizes)
+        if len(self.files) < self.slowest:
+            heapq.heappush(self.files, entry)
+        elif self.slowest > 0:
+            heapq.heappushpop(self.files, entry)
+
+    def report(self, file=sys.stderr):
+        report = {"phases": self.phases}
+        if self.files:
+            report["slowest_files"] = [{"path": path, "seconds": seconds, "bytes": sizes}
+                                       for seconds, path, sizes in sorted(self.files, reverse=True)]
+        print(json.dumps(report, indent=2), file=file)